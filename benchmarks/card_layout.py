@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+# Benchmark: rendering many cards with make-password-sheet layouts,
+# with and without the computed layout cache.
+#   usage: card_layout.py [cards]
+
+import sys
+import os
+import io
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import password_generator.password_generator as password_generator
+from password_generator import pdf_generator
+
+def bench(name, f):
+    t = time.perf_counter()
+    r = f()
+    t = time.perf_counter() - t
+    print("{:32s} {:8.3f} sec".format(name, t))
+    return r
+
+def uncached(self, dat, qr, title, hint, pwdelems):
+    # previous behaviour: compute geometry for every card.
+    geometry = pdf_generator.CardLayout._compute_geometry.__wrapped__
+    qr, title = bool(qr), bool(title)
+    if not (hint or pwdelems):
+        return geometry(self, 0, 0.0, 0.0, qr, title, hint, pwdelems)
+    lines = len(dat[0])
+    pwdsize, hintsize = geometry(self, lines, 0.0, 0.0, False, title, True, True).pwdsize_hintsize
+    pw = max(pdf_generator.font_and_width(w, pdf_generator.PwdFont, pwdsize)[1] for w in dat[0])
+    hw = max(pdf_generator.font_and_width(h, pdf_generator.HintFont, hintsize)[1] for h in dat[1])
+    return geometry(self, lines, pw, hw, qr, title, hint, pwdelems)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    # seeded (INSECURE) source: the same passphrases on every run
+    l, diag = password_generator.generate('[english]:48', count,
+                                          rng=password_generator.SeededRandom(0), _insecure=True)
+    elements = diag['elements']
+    dats = [pdf_generator._card_data(e)[0] for e in elements]
+    card = pdf_generator.BusinessCard
+
+    def layouts():
+        for dat in dats:
+            card._compute_layout(dat, qr=None, title=None, hint=True, pwdelems=True)
+
+    def render():
+        out = io.BytesIO()
+        pdf_generator.generate_pdf_batch(out, elements, layout='10', hint=True)
+        return len(out.getvalue())
+
+    print("{} cards".format(count))
+    # warm up the font metrics cache shared by both variants.
+    render()
+    pdf_generator.CardLayout._compute_geometry.cache_clear()
+
+    bench("layout, cached", layouts)
+    print("   {}".format(pdf_generator.CardLayout._compute_geometry.cache_info()))
+    size = bench("render -L 10, cached", render)
+
+    cached = pdf_generator.CardLayout._compute_layout
+    pdf_generator.CardLayout._compute_layout = uncached
+    try:
+        bench("layout, uncached", layouts)
+        size2 = bench("render -L 10, uncached", render)
+    finally:
+        pdf_generator.CardLayout._compute_layout = cached
+    print("PDF size: {} / {} bytes".format(size, size2))
+
+if __name__ == '__main__':
+    main()
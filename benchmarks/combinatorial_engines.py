@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+# Benchmark: counting engines of combinatorial specs (the "dp" table
+# and the "closed" inclusion-exclusion form, and "auto" choosing
+# between them) on wide specs, from scratch for each run: the count
+# for the requested entropy, then unranking of random indexes.
+#   usage: combinatorial_engines.py [count] [spec...]
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import password_generator.password_generator as password_generator
+from password_generator import combinatorial_passwords
+
+SPECS = ['{A1a1d1}:128', '{A3a3d3s3}:128', '{A3a3d3s3}:256', '{A2a2d2s2x2}:256', '{A4a4d4s4}:512']
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    specs = sys.argv[2:] or SPECS
+    for spec in specs:
+        groups, entropy = password_generator._parse_fspec(spec)
+        g = groups[0][1]
+        wordsets = [(password_generator.BasicCharacterCorpus(s), c) for s, c in zip(g.sets, g.reqcounts)]
+        results = {}
+        for engine in combinatorial_passwords.ENGINES:
+            t = time.perf_counter()
+            x = combinatorial_passwords.CombinatorialGenerator(
+                wordsets, canonical=True, engine=engine).get_repeated(entropy=entropy)
+            combs = x.len()
+            t1 = time.perf_counter()
+            for _ in range(count):
+                x.get_with_hint(password_generator.R.randrange(combs))
+            t2 = time.perf_counter()
+            results[engine] = (x.n, combs)
+            print("{:20s} {:6s} n={:4d} ({:6s}) count {:8.3f} sec, {} words {:8.3f} sec".format(
+                spec, engine, x.n, x.engine, t1 - t, count, t2 - t1))
+        assert len(set(results.values())) == 1, results
+
+if __name__ == '__main__':
+    main()
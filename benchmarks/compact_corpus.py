@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# Benchmark of corpus_convert.save_compact_corpus on a synthetic word list,
+# checked against the previous per-suffix dictionary packing.
+#   usage: compact_corpus.py [entries]
+
+import sys
+import os
+import io
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'password_generator'))
+import corpus_convert
+from corpus_loader import CompactedCorpus
+
+def save_compact_corpus_dict(ob, coll):
+    # data section as produced by the per-suffix dictionary packing.
+    coll = sorted((k.encode('ascii') + b'\n', h.encode('utf-8') + b'\n') for k, h in coll)
+    words = {}
+    for k, v in coll:
+        words[k] = None
+        words[v] = None
+    l = sorted(words.keys(), key=(lambda v: [*reversed(v), 256]))
+    dat = bytearray()
+    p = 0
+    for i in l:
+        if words[i] != None:
+            continue
+        dat.extend(i)
+        for ss in range(len(i)):
+            if i[ss:] in words:
+                words[i[ss:]] = p + ss
+        p += len(i)
+    ptr = bytearray(b'%07x\n' % (CompactedCorpus.MAGIC,))
+    for k, h in coll:
+        ptr.extend(b'%07x %07x\n' % (words[k], words[h]))
+    ob.write(dat)
+    ob.write(ptr)
+
+def synthetic(n, seed=1):
+    r = random.Random(seed)
+    kana = [chr(c) for c in range(0x3041, 0x3094)]
+    stems = [''.join(r.choice('aiueokgsztdnhbpmyrw') for _ in range(r.randint(2, 6)))
+             for _ in range(n // 20)]
+    ends = ['', 'a', 'i', 'u', 'e', 'o', 'ru', 'ta', 'nai', 'masu']
+    d = {}
+    while len(d) < n:
+        w = r.choice(stems) + r.choice(ends) + r.choice(stems)
+        d[w] = ''.join(r.choice(kana) for _ in range(r.randint(1, 4))) + r.choice(['する', 'い', 'な', ''])
+    return list(d.items())
+
+def bench(name, f, coll):
+    ob = io.BytesIO()
+    t = time.perf_counter()
+    f(ob, coll)
+    t = time.perf_counter() - t
+    print("{:24s} {:8.3f} sec {:10.0f} entries/sec".format(name, t, len(coll) / t))
+    return ob.getvalue()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    coll = synthetic(n)
+    new = bench("save_compact_corpus", corpus_convert.save_compact_corpus, coll)
+    old = bench("per-suffix dictionary", save_compact_corpus_dict, coll)
+    # compare data and index sections
+    same = new.split(CompactedCorpus.HEADER2)[1] == old
+    print("{} entries, {} bytes, {}".format(n, len(new), "SAME" if same else "DIFFERENT"))
+    if not same:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+# Compares packed corpora (v3) with their block-compressed variants:
+# file size, load time and random draws.
+#   usage: compressed_corpus.py [corpus names...]
+
+import sys
+import os
+import io
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'password_generator'))
+import corpus_convert
+from corpus_loader import CompactedCorpus
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'password_generator', 'corpus')
+
+def bench(label, data, ref, idx):
+    t = time.perf_counter()
+    c = CompactedCorpus(io.BytesIO(data))
+    tl = time.perf_counter() - t
+    t = time.perf_counter()
+    l = [c.get_with_hint(i) for i in idx]
+    t = time.perf_counter() - t
+    print("  {:12s} {:9d} bytes  load {:7.4f} sec  {:9.0f} draws/sec".format(
+        label, len(data), tl, len(idx) / t))
+    return l
+
+def main():
+    names = sys.argv[1:] or ['crossword', 'naist-jdic-simple', 'jwikipedia10k']
+    for name in names:
+        with open(os.path.join(CORPUS_DIR, name + '.corpus'), 'rb') as f:
+            data = f.read()
+        ref = CompactedCorpus(io.BytesIO(data))
+        coll = [tuple(ref.get_with_hint(i)) for i in range(ref.len())]
+        r = random.Random(1)
+        idx = [r.randrange(ref.len()) for _ in range(100000)]
+
+        print("{} ({} entries)".format(name, ref.len()))
+        expected = bench('v3', data, ref, idx)
+        for codec in ('zlib', 'lzma'):
+            for bl in (16, corpus_convert.BLOCK_ENTRIES, 256):
+                ob = io.BytesIO()
+                corpus_convert.save_compact_corpus(ob, coll, compress=codec, block_entries=bl)
+                l = bench('{}/{}'.format(codec, bl), ob.getvalue(), ref, idx)
+                if l != expected:
+                    print("MISMATCH in {} {}/{}".format(name, codec, bl))
+                    sys.exit(1)
+
+if __name__ == '__main__':
+    main()
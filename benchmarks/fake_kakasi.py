@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+# Stand-in for "kakasi -iutf8 -outf8 -rh -Ja -Ha", for testing corpus_convert
+# without kakasi.  Kana are romanized properly; each kanji becomes a fixed
+# syllable derived from its code point.  Like kakasi, output is
+# block-buffered unless written to a terminal.
+#   usage: fake_kakasi.py [--delay=SEC] [kakasi options...]
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'password_generator'))
+from corpus_convert import Romanization
+
+CONSONANTS = ['', 'k', 's', 't', 'n', 'h', 'm', 'r', 'g', 'z', 'd', 'b']
+VOWELS = 'aiueo'
+
+def kanji(c):
+    i = ord(c)
+    return CONSONANTS[i % len(CONSONANTS)] + VOWELS[i // len(CONSONANTS) % 5]
+
+def convert(line):
+    r = []
+    kana = []
+    for c in line:
+        if 'ぁ' <= c <= 'ゖ' or 'ァ' <= c <= 'ヶ' or c == 'ー':
+            kana.append(chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c)
+            continue
+        if kana:
+            r.append(Romanization.romanization(''.join(kana)))
+            kana = []
+        r.append(c if c < '\x80' else kanji(c))
+    if kana:
+        r.append(Romanization.romanization(''.join(kana)))
+    return ''.join(r)
+
+def main():
+    delay = 0.0
+    for a in sys.argv[1:]:
+        if a.startswith('--delay='):
+            delay = float(a[8:])
+    stdin = open(sys.stdin.fileno(), encoding='utf-8', errors='replace')
+    for line in stdin:
+        if delay:
+            time.sleep(delay)
+        print(convert(line.rstrip('\n')))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+# Benchmark: text width measurement for many cards, comparing the
+# unbounded per-string metrics dictionary with the glyph width cache.
+#   usage: font_metrics.py [cards]
+
+import sys
+import os
+import re
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import password_generator.password_generator as password_generator
+from password_generator import pdf_generator
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+fsize_cache = {}
+def font_and_width_dict(s, fonts, size):
+    # previous implementation
+    t = (s, fonts, size)
+    if t in fsize_cache:
+        return fsize_cache[t]
+    if type(fonts) is str:
+        font = fonts
+    elif re.match(r'\A[ -ÿ]*\Z', s):
+        font = fonts[-1]
+    else:
+        font = fonts[0]
+    r = (font, stringWidth(s, font, size))
+    fsize_cache[t] = r
+    return r
+
+def measure(f, cards):
+    # as in draw_text_fitted: full password, elements and hints,
+    # each at the nominal size and a shrunk size.
+    for w, h in cards:
+        for s, fonts in [("".join(w), pdf_generator.PwdFont)] + \
+                        [(e, pdf_generator.PwdFont) for e in w] + \
+                        [(e, pdf_generator.HintFont) for e in h]:
+            fw = f(s, fonts, 12)[1]
+            f(s, fonts, 12 * 0.9 * 100 / max(fw, 100))
+
+def bench(name, f, cards, reset):
+    t = time.perf_counter()
+    measure(f, cards)
+    t = time.perf_counter() - t
+    # second pass for the memory usage, which tracemalloc slows down.
+    reset()
+    tracemalloc.start()
+    measure(f, cards)
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("{:24s} {:8.3f} sec {:10.0f} cards/sec {:8d} KiB retained".format(name, t, len(cards) / t, mem // 1024))
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # seeded (INSECURE) source: the same passphrases on every run
+    l, diag = password_generator.generate('[english]3-[jwikipedia10k]3', count,
+                                          rng=password_generator.SeededRandom(0), _insecure=True)
+    cards = [pdf_generator._card_data(e)[0] for e in diag['elements']]
+    print("{} cards".format(count))
+    # CID fonts are registered lazily, on first use by pdf_generator.
+    for font in pdf_generator.CIDFonts:
+        pdf_generator._load_font(font)
+
+    bench("per-string dict", font_and_width_dict, cards, fsize_cache.clear)
+    fsize_cache.clear()
+    bench("glyph widths + LRU", pdf_generator.font_and_width, cards, pdf_generator._font_and_width1.cache_clear)
+    print("   {}".format(pdf_generator._font_and_width1.cache_info()))
+
+    for w, h in cards[:1000]:
+        for s in w + h:
+            for fonts in (pdf_generator.PwdFont, pdf_generator.HintFont):
+                a = font_and_width_dict(s, fonts, 10.5)
+                b = pdf_generator.font_and_width(s, fonts, 10.5)
+                assert a[0] == b[0] and abs(a[1] - b[1]) < 1e-9, (s, a, b)
+
+if __name__ == '__main__':
+    main()
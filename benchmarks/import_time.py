@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+# Import-time regression check for pdf_generator: runs
+# "python -X importtime" several times and fails when the best
+# cumulative import time exceeds the budget, or when modules which
+# should be loaded only for drawing are imported.  The budget is
+# relative to the start-up of a bare interpreter ("python -c pass"),
+# as in startup.py, and bytecode is cached in a temporary directory.
+#   usage: import_time.py [ratio] [runs]
+
+import sys
+import os
+import re
+import time
+import tempfile
+import subprocess
+
+MODULE = 'password_generator.pdf_generator'
+LAZY = ('reportlab.pdfgen', 'reportlab.pdfbase', 'reportlab.platypus', 'qrcode', 'PIL')
+
+def import_time(module, env=None):
+    # returns (cumulative time in ms, list of imported modules)
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                       cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'),
+                       stderr=subprocess.PIPE, universal_newlines=True, check=True, env=env)
+    total = None
+    modules = []
+    for l in p.stderr.splitlines():
+        mo = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$', l)
+        if not mo:
+            continue
+        modules.append(mo.group(4))
+        if mo.group(3) == '' and mo.group(4) == module:
+            total = int(mo.group(2)) / 1000.0
+    return total, modules
+
+def bare_startup(env=None):
+    # wall time of "python -c pass" in ms
+    t = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True, env=env)
+    return (time.perf_counter() - t) * 1000.0
+
+def main():
+    ratio = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=cache)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+        # the first run writes the bytecode cache.
+        import_time(MODULE, env)
+        base = min(bare_startup(env) for _ in range(runs))
+        results = [import_time(MODULE, env) for _ in range(runs)]
+
+    best = min(t for t, m in results)
+    budget = base * ratio
+    print("python -c pass: {:.1f} ms (best of {})".format(base, runs))
+    print("import {}: {:.1f} ms = {:.2f} x, budget {:.2f} x".format(MODULE, best, best / base, ratio))
+
+    failed = False
+    loaded = sorted(set(m for m in results[0][1] if m.startswith(LAZY)))
+    if loaded:
+        print("FAIL: imported at load time: {}".format(", ".join(loaded)))
+        failed = True
+    if best > budget:
+        print("FAIL: over budget")
+        failed = True
+    exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
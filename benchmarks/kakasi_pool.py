@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+# Benchmark of CorpusConvert.process_kakasi with the kakasi converter pool,
+# using fake_kakasi.py; results are checked against direct conversion.
+#   usage: kakasi_pool.py [words] [delay per line (sec)]
+
+import sys
+import os
+import time
+import random
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'password_generator'))
+sys.path.insert(0, BENCH_DIR)
+import corpus_convert
+import fake_kakasi
+
+def source(n, seed=1):
+    r = random.Random(seed)
+    kanji = [chr(c) for c in range(0x4e00, 0x4e00 + 2000)]
+    kana = [chr(c) for c in range(0x3042, 0x3093)]
+    for i in range(n):
+        yield ''.join(r.choice(kanji) for _ in range(r.randint(1, 3))) + ''.join(
+            r.choice(kana) for _ in range(r.randint(0, 2)))
+
+def expected(words):
+    out = []
+    seen = {}
+    for n, w in enumerate(words):
+        ro = fake_kakasi.convert(w).replace("'", '')
+        if not corpus_convert.password_ok(ro):
+            out.append("### {} {}".format(n, ro))
+        elif ro in seen:
+            out.append("## {}\t{}\t{}".format(ro, w, seen[ro]))
+        else:
+            seen[ro] = w
+            out.append((ro, w))
+    return out
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    delay = sys.argv[2] if len(sys.argv) > 2 else '0'
+    words = list(source(n))
+    ref = expected(words)
+    corpus_convert.CorpusConvert.KAKASI = '{} {} --delay={}'.format(
+        sys.executable, os.path.join(BENCH_DIR, 'fake_kakasi.py'), delay)
+    for jobs in (1, 2, 4):
+        t = time.perf_counter()
+        b, out = corpus_convert.CorpusConvert.process_kakasi(
+            iter(words), 'bench.src', '', jobs=jobs)
+        t = time.perf_counter() - t
+        print("{} processes: {:8.3f} sec {:10.0f} words/sec".format(jobs, t, n / t))
+        if out != ref:
+            bad = [(a, b) for a, b in zip(out, ref) if a != b]
+            print("MISMATCH: {} entries differ, e.g. {}".format(len(bad), bad[:3]))
+            sys.exit(1)
+    print("{} words, output identical".format(n))
+
+if __name__ == '__main__':
+    main()
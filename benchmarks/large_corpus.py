@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+# Builds a large synthetic corpus with the streaming builder in the wide
+# packed format, then checks and times loading it through mmap.
+#   usage: large_corpus.py [entries] [tmpdir]
+
+import sys
+import os
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'password_generator'))
+import corpus_convert
+from corpus_loader import CompactedCorpus
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+KANA = [chr(c) for c in range(0x3042, 0x3092)]
+
+def word(i):
+    # fixed width, so that the numeric order is the sorted order
+    s = ''
+    for _ in range(6):
+        i, r = divmod(i, 26)
+        s = LETTERS[r] + s
+    return s
+
+def hint(i):
+    s = ''
+    while True:
+        i, r = divmod(i, len(KANA))
+        s += KANA[r]
+        if i == 0:
+            return s
+
+def entries(n):
+    # visit all entries in a scattered order
+    p = 7919
+    while n % p == 0:
+        p += 2
+    for j in range(n):
+        i = j * p % n
+        yield (word(i), hint(i))
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    tmpdir = sys.argv[2] if len(sys.argv) > 2 else None
+    with tempfile.TemporaryDirectory(dir=tmpdir) as td:
+        fn = os.path.join(td, 'large.corpus')
+        t = time.perf_counter()
+        with open(fn, 'wb') as ob:
+            corpus_convert.save_compact_corpus_external(ob, entries(n), tmpdir=td)
+        t = time.perf_counter() - t
+        print("build:  {:8.3f} sec {:10.0f} entries/sec, {} bytes".format(
+            t, n / t, os.path.getsize(fn)))
+
+        m = rss()
+        t = time.perf_counter()
+        c = CompactedCorpus(fn)
+        t = time.perf_counter() - t
+        print("load:   {:8.3f} sec, {} kB resident increase".format(t, (rss() - m) // 1024))
+        assert c.len() == n
+
+        r = random.Random(1)
+        idx = [r.randrange(n) for _ in range(100000)] + [0, n - 1]
+        t = time.perf_counter()
+        l = [c.get_with_hint(i) for i in idx]
+        t = time.perf_counter() - t
+        print("lookup: {:8.3f} sec {:10.0f} entries/sec".format(t, len(idx) / t))
+
+        bad = [i for i, e in zip(idx, l) if e != (word(i), hint(i))]
+        print("{} entries, {} mismatches".format(n, len(bad)))
+        del c, l
+        if bad:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+# Benchmark: QR codes on many cards, comparing the raster path
+# (qrcode.make, PIL image, ImageReader) with vector drawing of the
+# module matrix by a reused encoder.
+#   usage: qr_cards.py [cards]
+
+import sys
+import os
+import io
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import password_generator.password_generator as password_generator
+from password_generator import pdf_generator
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
+import qrcode
+
+SIZE = pdf_generator.BusinessCard.qrsize
+
+def raster(data):
+    out = io.BytesIO()
+    c = canvas.Canvas(out, pagesize=pdf_generator.A4)
+    for d in data:
+        img = ImageReader(qrcode.make(d).get_image())
+        c.drawImage(img, 0, 0, width = SIZE, height = SIZE)
+        c.showPage()
+    c.save()
+    return len(out.getvalue())
+
+def vector(data):
+    out = io.BytesIO()
+    c = canvas.Canvas(out, pagesize=pdf_generator.A4)
+    for d in data:
+        pdf_generator.draw_qr(c, pdf_generator.qr_modules(d), 0, 0, SIZE)
+        c.showPage()
+    c.save()
+    return len(out.getvalue())
+
+def bench(name, f, *args):
+    t = time.perf_counter()
+    size = f(*args)
+    t = time.perf_counter() - t
+    print("{:32s} {:8.3f} sec {:10d} bytes".format(name, t, size))
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    # seeded (INSECURE) source: the same passphrases on every run
+    l, diag = password_generator.generate('[english]:48', count,
+                                          rng=password_generator.SeededRandom(0), _insecure=True)
+    passwords = [p for p, h in l]
+    wifi = ['WIFI:T:WPA;S:"{}";P:"{}";;'.format("MYWIFI", pdf_generator.wifi_quote(p)) for p in passwords]
+    print("{} cards".format(count))
+
+    bench("raster QR", raster, passwords)
+    bench("vector QR", vector, passwords)
+    bench("raster QR, WiFi", raster, wifi)
+    bench("vector QR, WiFi", vector, wifi)
+
+    def sheet():
+        out = io.BytesIO()
+        pdf_generator.generate_pdf_batch(out, diag['elements'], layout='10',
+                                         hint=True, wifi_ssid="MYWIFI")
+        return len(out.getvalue())
+    bench("make-password-sheet -L 10 -HQ", sheet)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+# Benchmark: random sources for passphrase generation, comparing
+# random.SystemRandom with the buffered OSRandom, and the
+# reproducibility of the (INSECURE) seeded source.  A chi-square
+# statistic over a large sample of digits checks uniformity.
+#   usage: random_source.py [count] [seed]
+
+import sys
+import os
+import time
+import hashlib
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import password_generator.password_generator as password_generator
+
+SPEC = '[english]3-[kana]2-{A1a1d1}10-[uuid]'
+
+def bench(name, f, count):
+    t = time.perf_counter()
+    r = f(count)
+    t = time.perf_counter() - t
+    print("{:32s} {:10.0f} items/sec".format(name, count / t))
+    return r
+
+def digest(rng, count):
+    l, diag = password_generator.generate(SPEC, count, rng=rng, _insecure=True)
+    return hashlib.sha256("\n".join(p for p, h in l).encode('utf-8')).hexdigest()
+
+def chisquare(rng, count):
+    # 9 degrees of freedom: about 21.7 at p = 0.01
+    freq = [0] * 10
+    for _ in range(count):
+        freq[rng.randrange(10)] += 1
+    return sum((f - count / 10) ** 2 / (count / 10) for f in freq)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    s = random.SystemRandom()
+    s.secure = True
+    o = password_generator.OSRandom()
+    password_generator.generate(SPEC, 10) # load corpora
+    bench("SystemRandom.randrange(2009)", lambda n: [s.randrange(2009) for _ in range(n)], count)
+    bench("OSRandom.randrange(2009)", lambda n: [o.randrange(2009) for _ in range(n)], count)
+    bench("generate(), SystemRandom", lambda n: password_generator.generate(SPEC, n, rng=s), count // 10)
+    bench("generate(), OSRandom", lambda n: password_generator.generate(SPEC, n), count // 10)
+
+    a = bench("generate(), seeded", lambda n: digest(password_generator.SeededRandom(seed), n), count // 10)
+    b = digest(password_generator.SeededRandom(seed), count // 10)
+    print("seed {}: {} ({})".format(seed, a, "repeatable" if a == b else "NOT REPEATABLE"))
+
+    print("chi-square, 9 d.f.: OSRandom {:.2f}, seeded {:.2f}".format(
+        chisquare(o, count), chisquare(password_generator.SeededRandom(seed), count)))
+    if a != b:
+        exit(1)
+
+if __name__ == '__main__':
+    main()
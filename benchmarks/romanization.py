@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+# Benchmark and differential check of corpus_convert.Romanization:
+# table-driven romanization() against the rewrite rules applied directly.
+#   usage: romanization.py [naist-jdic.dic]
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'password_generator'))
+from corpus_convert import Sexp, Romanization
+
+def readings(lines):
+    for s in lines:
+        try:
+            l = Sexp.get_sexp_val('(' + s + ')')
+            p = dict([l[0]] + l[1])['読み']
+        except (ValueError, LookupError, TypeError):
+            continue
+        if p[0] == '{':
+            p = p[1:].partition('/')[0]
+        yield p
+
+def bench(name, f, l):
+    t = time.perf_counter()
+    r = [f(p) for p in l]
+    t = time.perf_counter() - t
+    print("{:24s} {:8.3f} sec {:10.0f} readings/sec".format(name, t, len(l) / t))
+    return r
+
+def main():
+    fname = (sys.argv[1] if len(sys.argv) > 1 else
+             '/usr/share/chasen/dic/naist-jdic-utf8/naist-jdic.dic')
+    with open(fname, encoding='utf-8') as f:
+        l = list(readings(f))
+    r1 = bench("romanization_by_rules", Romanization.romanization_by_rules, l)
+    r2 = bench("romanization (cold)", Romanization.romanization, l)
+    bench("romanization (cached)", Romanization.romanization, l)
+    bad = [(p, a, b) for p, a, b in zip(l, r1, r2) if a != b]
+    for p, a, b in bad[:10]:
+        print("MISMATCH: {} -> {!r} (rules), {!r} (table)".format(p, a, b))
+    print("{} readings, {} mismatches, {} clusters in table".format(
+        len(l), len(bad), len(Romanization.table)))
+    if bad:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+# Benchmark: S-expression parsing of chasen dictionaries (corpus_convert.Sexp).
+#   usage: sexp_parse.py [naist-jdic.dic]
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'password_generator'))
+from corpus_convert import Sexp
+
+def bench(name, f, lines):
+    t = time.perf_counter()
+    for s in lines:
+        try:
+            f('(' + s + ')')
+        except ValueError:
+            pass
+    t = time.perf_counter() - t
+    print("{:24s} {:8.3f} sec {:10.0f} lines/sec".format(name, t, len(lines) / t))
+    return t
+
+def main():
+    fname = (sys.argv[1] if len(sys.argv) > 1 else
+             '/usr/share/chasen/dic/naist-jdic-utf8/naist-jdic.dic')
+    with open(fname, encoding='utf-8') as f:
+        lines = f.readlines()
+    t1 = bench("get_sexp_val", Sexp.get_sexp_val, lines)
+    t2 = bench("scanner only (_parse)", Sexp._parse, lines)
+    print("speedup of fast path: {:.2f}x".format(t2 / t1))
+
+if __name__ == '__main__':
+    main()
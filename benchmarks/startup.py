@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# Start-up regression check for the make-password command: measures
+# the cumulative import time of password_generator (by "python -X
+# importtime") and the wall time until the first passphrase of a
+# one-shot "make-password j:64" is printed.  Budgets are relative to
+# the start-up of a bare interpreter ("python -c pass") measured in
+# the same run, so that the check does not depend on the machine.
+# Bytecode is cached in a temporary directory, as it is in an
+# installed package.  With a record file, results are appended with
+# the version, to be tracked per release.
+#   usage: startup.py [import_ratio] [output_ratio] [runs] [record_file]
+
+import sys
+import os
+import time
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from import_time import import_time
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MODULE = 'password_generator.password_generator'
+COMMAND = [os.path.join(TOP, 'make-password'), 'j:64']
+LAZY = ('inspect', 'argparse', 'random', 'password_generator.pdf_generator', 'password_generator.tk_gui')
+
+def first_output(command, env):
+    # returns (ms until the first line of output, ms until exit)
+    t = time.perf_counter()
+    p = subprocess.Popen([sys.executable] + command, cwd=TOP, env=env,
+                         stdout=subprocess.PIPE, universal_newlines=True)
+    line = p.stdout.readline()
+    t1 = time.perf_counter() - t
+    p.communicate()
+    t2 = time.perf_counter() - t
+    if p.returncode != 0:
+        raise RuntimeError("{} failed".format(" ".join(command)))
+    return t1 * 1000.0, t2 * 1000.0
+
+def main():
+    import_ratio = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    output_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 4.0
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    record = sys.argv[4] if len(sys.argv) > 4 else None
+
+    sys.path.insert(0, TOP)
+    from password_generator import VERSION
+
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=cache)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+        # first runs write the bytecode cache.
+        import_time(MODULE, env)
+        first_output(COMMAND, env)
+
+        base = min(first_output(['-c', 'pass'], env)[1] for _ in range(runs))
+        imports = [import_time(MODULE, env) for _ in range(runs)]
+        outputs = [first_output(COMMAND, env) for _ in range(runs)]
+
+    best_import = min(t for t, m in imports)
+    best_output = min(t for t, e in outputs)
+    best_exit = min(e for t, e in outputs)
+    print("python -c pass: {:.1f} ms (best of {})".format(base, runs))
+    print("import {}: {:.1f} ms = {:.2f} x, budget {:.2f} x".format(
+        MODULE, best_import, best_import / base, import_ratio))
+    print("make-password j:64: first output {:.1f} ms = {:.2f} x, exit {:.1f} ms, budget {:.2f} x".format(
+        best_output, best_output / base, best_exit, output_ratio))
+
+    if record:
+        with open(record, 'a') as f:
+            f.write("{}\t{}\t{:.1f}\t{:.1f}\t{:.1f}\t{:.1f}\n".format(
+                time.strftime('%Y-%m-%d'), VERSION, base, best_import, best_output, best_exit))
+
+    failed = False
+    loaded = sorted(set(m for m in imports[0][1] if m.startswith(LAZY)))
+    if loaded:
+        print("FAIL: imported at load time: {}".format(", ".join(loaded)))
+        failed = True
+    if best_import > base * import_ratio:
+        print("FAIL: import over budget")
+        failed = True
+    if best_output > base * output_ratio:
+        print("FAIL: first output over budget")
+        failed = True
+    exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
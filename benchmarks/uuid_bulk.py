@@ -0,0 +1,34 @@
+#!/usr/bin/python3
+# Benchmark: bulk generation of the [uuid] builtin corpus
+# compared with get_with_hint() on random indexes and uuid.uuid4().
+
+import sys
+import os
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import password_generator
+
+def bench(name, f, count):
+    t = time.perf_counter()
+    f(count)
+    t = time.perf_counter() - t
+    print("{:24s} {:10.0f} items/sec".format(name, count / t))
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    c = password_generator.CorpusList.get_corpus('uuid')
+
+    bench("uuid.uuid4()", lambda n: [str(uuid.uuid4()) for _ in range(n)], count)
+    bench("get_randomly()", lambda n: [c.get_randomly() for _ in range(n)], count)
+    bench("get_randomly_bulk()", c.get_randomly_bulk, count)
+    bench("generate('[uuid]')", lambda n: password_generator.generate('[uuid]', n), count)
+
+    # check that bulk outputs are valid under the index mapping.
+    for w in c.get_randomly_bulk(1000):
+        i = c.from_uuid_int(int(w.word.replace('-', ''), 16))
+        assert c.get_with_hint(i) == w, w
+
+if __name__ == '__main__':
+    main()
@@ -28,11 +28,47 @@ from math import log2, ceil
 # Total number of computation steps is:
 #  n * Π_i (v_i)
 
+# Alternatively, f(n, v) has a closed form using exponential
+# generating functions:
+#
+# f(n, v) = n! [x^n] Π_i (exp(N_i x) - T_i(x)),
+#    T_i(x) = Σ_{k < v_i} (N_i x)^k / k!
+#
+# Expanding the product by inclusion-exclusion on the set S of
+# truncated factors gives
+#
+# f(n, v) = Σ_S (-1)^|S| Σ_k C(n, k) * c_S(k) * M_S^(n - k)
+#
+#   where M_S = Σ_{i ∉ S} N_i, and
+#         c_S(k) = k! [x^k] Π_{i ∈ S} T_i(x)
+#                (number of k-character strings from sets in S,
+#                 each set i used less than v_i times; an integer).
+#
+# Terms with equal M_S are merged, so each evaluation costs at most
+#  2^m * (Σ_i v_i)^2 steps, independent of Π_i (v_i).
+
 #def dprint(*args, **kwargs): pass
 #dprint=print
 
+ENGINES = ('auto', 'dp', 'closed')
+
+# word sets are expanded in memory for canonification
+MAX_WORDSET = 1 << 20
+
+_binomial_table = [[1]]
+def _binomial_rows(a):
+    """Return Pascal's triangle containing at least up to row a."""
+    rows = _binomial_table
+    while len(rows) <= a:
+        r = rows[-1]
+        rows.append([1] + [r[j] + r[j + 1] for j in range(len(r) - 1)] + [1])
+    return rows
+
 class CombinatorialGenerator(password_generator.WordsCorpusBase):
-    def __init__(self, wordsets, canonical=False):
+    def __init__(self, wordsets, canonical=False, engine='auto'):
+        if engine not in ENGINES:
+            raise ValueError("unknown counting engine {}".format(engine))
+
         sets = []
         lens = []
         reqcounts = []
@@ -43,11 +79,14 @@ class CombinatorialGenerator(password_generator.WordsCorpusBase):
             reqcounts.append(c)
 
         self.alli = range(len(sets))
+        self.is_multiword = wordsets[0][0].is_words
         self.sets = tuple(sets)
         self.lens = tuple(lens)
         self.reqcounts = tuple(reqcounts)
         self.wordsets = [d for d, _ in wordsets]
         self.comb_cache = {}
+        self.closed_cache = {}
+        self.engine = engine
         self.name = "{{{}}}".format(",".join(wl.name for wl in self.wordsets))
 
     def get_repeated(self, *n, **k):
@@ -62,10 +101,31 @@ class CombinatorialGenerator(password_generator.WordsCorpusBase):
         else:
             prep = lambda x: x
         sets = []
+        is_words = wordsets[0][0].is_words
         for i, (d, _) in enumerate(wordsets):
-            if d.is_words:
-                raise BadFormatError("only character-based set can be used for combinatorial passwords")
-            sets.append((0, frozenset(prep(wordsets[i][0])), i))
+            if d.is_words != is_words:
+                raise BadFormatError("character-based and word-based sets cannot be mixed in combinatorial passwords")
+            if is_words:
+                try:
+                    size = d.len()
+                except (OverflowError, TypeError, NotImplementedError):
+                    size = None
+                if size == None or size > MAX_WORDSET:
+                    raise BadFormatError("word set {} ({}) is too large for combinations (at most {} words)".format
+                                         (i, d.name, MAX_WORDSET))
+                sets.append((0, frozenset(d.get_word(j) for j in range(size)), i))
+            else:
+                sets.append((0, frozenset(prep(wordsets[i][0])), i))
+        if is_words:
+            # word corpora often share some words (e.g. "mare" is
+            # both English and romanized Japanese).  Partially
+            # overlapping words are given to the earlier set.
+            for j in range(len(sets)):
+                l, s, i = sets[j]
+                for _, s0, _ in sets[:j]:
+                    if not (s.isdisjoint(s0) or s.issubset(s0) or s.issuperset(s0)):
+                        s = s - s0
+                sets[j] = (l, s, i)
         outsets = []
         for round in range(len(wordsets)):
             do_repeat = False
@@ -100,7 +160,10 @@ class CombinatorialGenerator(password_generator.WordsCorpusBase):
         o = []
         for ii, (l, s, i) in enumerate(sets):
             assert(i == ii)
-            o.append(("".join(sorted(list(s))), wordsets[i][1]))
+            if is_words:
+                o.append((tuple(sorted(s)), wordsets[i][1]))
+            else:
+                o.append(("".join(sorted(list(s))), wordsets[i][1]))
         #print("final: o={}".format(o))
         return o
 
@@ -123,6 +186,7 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
         self.combs = None
         if len(a) == 1 and entropy == None:
             self.n = a[0]
+            self.engine = self._choose_engine(self.n)
         elif len(a) == 0 and entropy != None:
             self.n = self.__guess_n(entropy)
         else:
@@ -136,6 +200,7 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
         if (nc < 2):
             raise BadFormatError("impossible to generate combinatorial corpus")
         n = max(int(ceil(entropy / log2(nc))), sum(self.reqcounts))
+        self.engine = self._choose_engine(n)
         # initial guess:
         #   Number of combinations is always less than those without charset restrictions.
         #   Thus, floor(entropy/log2(nc)) characters is below the solution,
@@ -143,7 +208,7 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
         #   Also, sum(reqcounts) characters is required to meet charset restrictions.
 
         while True:
-            combs = self.combinations(n, self.lens, self.reqcounts, cache=self.comb_cache)
+            combs = self._count(n, self.reqcounts)
             if combs > 0 and log2(combs) >= entropy:
                 break
             #if combs: print("trying {:2d} characters: entropy = {:7.3f} <  {:7.3f}".format(n, log2(combs), entropy))
@@ -154,7 +219,7 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
 
     def len(self):
         if self.combs == None:
-            combs = self.combinations(self.n, self.lens, self.reqcounts, cache=self.comb_cache)
+            combs = self._count(self.n, self.reqcounts)
             if combs == 0:
                 raise BadFormatError("impossible combinatorial corpus: no solution")
             self.combs = combs
@@ -165,6 +230,25 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
         return log2(self.len())
 
     def get_with_hint(self, x):
+        if self.is_multiword:
+            e = self.get_elements_with_hint(x)
+            return password_generator.WordTuple(" ".join(w.word for w in e),
+                                                " ".join(w.hint for w in e))
+        s = self._unrank(x)
+        return password_generator.WordTuple("".join(s), self.get_hint_by_word(s))
+
+    def get_elements_with_hint(self, x):
+        """Get a specific entry as a list of WordTuples, one for each word.
+
+        Only meaningful for combinations of word-based sets."""
+        s = self._unrank(x)
+        return [password_generator.WordTuple(w, w if h == None else h)
+                for w, h in zip(s, self._hints(s))]
+
+    def get_elements_randomly(self, rng=None):
+        return self.get_elements_with_hint((rng or password_generator.R).randrange(self.len()))
+
+    def _unrank(self, x):
         alli = self.alli
 
         if self.combs == None:
@@ -176,7 +260,7 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
                 assert(x == lo)
                 return []
 
-            assert(hi - lo == self.comb_cache[(n, v)])
+            assert(hi - lo == self._count(n, v))
             assert(lo <= x < hi)
             #dprint("SUB: x={} lo,hi={},{}, n={}, v={}".format(x, lo, hi, n, v))
             # to decide which sets to generate
@@ -191,7 +275,7 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
             s = lo
             for i in alli:
                 if f[i]:
-                    charn = self.comb_cache[(n-1, self._v_decr(v,i))]
+                    charn = self._count(n-1, self._v_decr(v,i))
                     setn = charn * self.lens[i]
                     top.append((s, s + setn, i, charn))
                     s += setn
@@ -210,9 +294,31 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
             n_hi = n_lo + charn
             return [c] + sub(x, n - 1, self._v_decr(v,i), n_lo, n_hi)
 
-        s = sub(x, self.n, self.reqcounts, 0, self.combs)
-
-        return password_generator.WordTuple("".join(s), self.get_hint_by_word(s))
+        return sub(x, self.n, self.reqcounts, 0, self.combs)
+
+    def _choose_engine(self, n):
+        # rough step counts of filling the table for n characters:
+        # the DP visits every (n, v) state, while the closed form
+        # evaluates n-step chains of polynomials cached by v.
+        if self.engine != 'auto':
+            return self.engine
+        m = len(self.lens)
+        dp_cost = n * m
+        for c in self.reqcounts:
+            dp_cost *= c + 1
+        d = min(n, sum(self.reqcounts))
+        nsets = sum(1 for c in self.reqcounts if c > 0)
+        closed_cost = n * (1 << nsets) * (d + 1)
+        return 'dp' if dp_cost <= closed_cost else 'closed'
+
+    def _count(self, n, v):
+        t = (n, v)
+        if t not in self.comb_cache:
+            if self.engine == 'closed':
+                self.comb_cache[t] = self.combinations_closed(n, self.lens, v, cache=self.closed_cache)
+            else:
+                self.combinations(n, self.lens, v, cache=self.comb_cache)
+        return self.comb_cache[t]
 
     @staticmethod
     def _v_decr(v, i, alli=None):
@@ -246,6 +352,59 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
 
         return rec(n, v)
 
+    @classmethod
+    def combinations_closed(self, n, N, v, cache=None):
+        # see the comment at the top of this file.
+        if sum(v) > n:
+            return 0
+
+        if cache == None:
+            cache = {}
+        terms = self._closed_terms(N, v, cache)
+
+        binom = _binomial_rows(n)[n]
+        total = 0
+        for m, p in terms:
+            for k, ck in enumerate(p):
+                if ck:
+                    total += binom[k] * ck * m ** (n - k)
+        return total
+
+    @classmethod
+    def _closed_terms(self, N, v, cache):
+        # returns list of (M_S, c_S), merged over S with equal M_S.
+        # Products are cached by prefixes of v.
+        l = len(v)
+        if l == 0:
+            return [(0, [1])]
+        if v in cache:
+            return cache[v]
+
+        terms = self._closed_terms(N[:-1], v[:-1], cache)
+        Ni, vi = N[-1], v[-1]
+        trunc = [Ni ** k for k in range(vi)]
+        binom = _binomial_rows(max((len(p) for m, p in terms)) + vi)
+        o = {}
+        def add(m, p):
+            q = o.get(m)
+            if q is None:
+                o[m] = p
+                return
+            if len(q) < len(p):
+                q, p = p, q
+            o[m] = [x + y for x, y in zip(q, p)] + q[len(p):]
+        for m, p in terms:
+            add(m + Ni, p)
+            if vi > 0:
+                r = [0] * (len(p) + vi - 1)
+                for j, pj in enumerate(p):
+                    if pj == 0: continue
+                    for k, tk in enumerate(trunc):
+                        r[j + k] -= binom[j + k][j] * pj * tk
+                add(m, r)
+        o = cache[v] = [(m, p) for m, p in o.items() if any(p)]
+        return o
+
     def subset(self, set):
         # until output is sorted
         raise ValueError("combinatorial corpus is not subsettable")
@@ -258,6 +417,12 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
         raise NotImplementedError
 
     def get_hint_by_word(self, w):
+        o = self._hints(w)
+        if None in o:
+            return None
+        return "".join(o)
+
+    def _hints(self, w):
         # expand hint based on most-comprehensive base corpus:
         o = []
         for i in w:
@@ -266,17 +431,25 @@ class CombinatorialWordDictionary(password_generator.WordsCorpusBase):
                 k = d.get_hint_by_word(i)
                 if k != None and len(k) > len(r or ""):
                     r = k
-            if r == None:
-                return None
             o.append(r)
-
-        return "".join(o)
+        return o
         
 def main():
-    from random import SystemRandom
-    R = SystemRandom()
-    import sys
-    n, *args = sys.argv[1:]
+    import sys, time
+    argv = sys.argv[1:]
+    engine = 'auto'
+    check = False
+    R = password_generator.R
+    # options: --engine={auto,dp,closed}, --check (compare both engines)
+    while argv and argv[0].startswith('--'):
+        o = argv.pop(0)
+        if o.startswith('--engine='):
+            engine = o[len('--engine='):]
+        elif o == '--check':
+            check = True
+        else:
+            sys.exit("unknown option {}".format(o))
+    n, *args = argv
     n = int(n)
     l = []
     r = []
@@ -288,12 +461,24 @@ def main():
         r.append((chars, reqcount))
         l.append((sets, reqcount))
     print("original   requests={}, n={}".format(r, n))
-    g = CombinatorialGenerator(l)
+    g = CombinatorialGenerator(l, engine=engine)
     print("canonified requests={}".format(list(zip(g.sets, g.reqcounts))))
 
+    t = time.perf_counter()
     x = g.get_repeated(n)
 
-    print("entropy = {:.3f} bits".format(x.entropy()))
+    print("entropy = {:.3f} bits ({} engine, {:.3f} sec)".format(
+        x.entropy(), x.engine, time.perf_counter() - t))
+
+    if check:
+        for e in ENGINES[1:]:
+            t = time.perf_counter()
+            y = CombinatorialGenerator(l, engine=e).get_repeated(n)
+            ok = y.len() == x.len()
+            print("  {:6s} engine: {:.3f} sec, {}".format(
+                e, time.perf_counter() - t, "agreed" if ok else "MISMATCH"))
+            if not ok:
+                sys.exit(1)
 
     if x.combs > 50:
         for i in range(10):
@@ -12,6 +12,19 @@ import io
 import re
 import threading
 import json
+import os
+import time
+import concurrent.futures
+import functools
+import heapq
+import zlib
+import shutil
+import hashlib
+import sqlite3
+import queue
+import itertools
+import collections
+import tempfile
 from contextlib import ExitStack
 
 from corpus_loader import CompactedCorpus
@@ -22,79 +35,79 @@ BOILERPLATE = """### Generated file. DO NOT EDIT.
 #"""
 
 class Sexp:
-    regex = re.compile(r"""(?P<space>\s+)|
-                           (?P<lparen>\()|
-                           (?P<rparen>\))|
-                           (?P<str>"[^"]*")|
-                           (?P<token>[^\s][^\s()]*)|
-                           (?P<end>\Z)""", re.A | re.X)
+    # one token per match, with preceding spaces.
+    # Group numbers: 1: lparen, 2: rparen, 3: str, 4: token
+    scanner = re.compile(r"""\s*(?:(\()|
+                                   (\))|
+                                   ("[^"]*")|
+                                   ([^\s][^\s()]*))""", re.A | re.X)
 
     @classmethod
     def _raiseerror(self, s, pos, e):
         raise ValueError("sexp parse error ({}) as {!r} ##HERE## {!r}".format(pos, s[0:pos], s[pos:]))
 
-    @classmethod
-    def _token(self, s, pos):
-        mo = self.regex.match(s, pos=pos)
-        if not mo:
-            self._raiseerror(s, pos, 0)
-        k = mo.lastgroup
-        v = mo.group(k)
-        # print(repr((pos, k, v)))
-        if k == 'space':
-            return self._token(s, mo.end())
-        # if k == 'token' and re.match("\A\d+\Z", v):
-        #     k = 'num'
-        return k, v, mo.end()
+    # whitespaces other than those matched by \s under re.A
+    non_ascii_spaces = re.compile('[\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]')
 
     @classmethod
-    def _get(self, s, pos, allowed=()):
-        k, v, nextpos = self._token(s, pos)
-        if k == 'lparen':
-            return self._get_list_to_rparen(s, nextpos)
-        elif k in ('token', 'num', 'str') or k in allowed:
-            return k, v, nextpos
-        else:
-            self._raiseerror(s, pos, 1)
+    def get_sexp_val(self, s):
+        """Parse a S-expression to nested lists of strings.
 
-    @classmethod
-    def _get_list_to_rparen(self, s, pos):
-        o = []
-        while True:
-            k, v, nextpos = self._get(s, pos, ('rparen',))
-            if k == 'lparen':
-                assert(False)
-            elif k in ('num', 'token', 'list', 'str'):
-                o.append((k, v))
-                pos =  nextpos
-            elif k == 'rparen':
-                break
+        Parsing is done in a single pass, without recursion."""
+        if '"' in s or self.non_ascii_spaces.search(s):
+            return self._parse(s)
+        # fast path: tokens are separated by spaces and parentheses only.
+        top = cur = []
+        stack = []
+        for t in s.replace('(', ' ( ').replace(')', ' ) ').split():
+            if t == '(':
+                stack.append(cur)
+                cur = []
+            elif t == ')':
+                if not stack:
+                    return self._parse(s) # raises
+                l = cur
+                cur = stack.pop()
+                cur.append(l)
             else:
-                self._raiseerror(s, pos, 2)
-        return 'list', o, nextpos
+                cur.append(t)
+        if stack or len(top) != 1:
+            return self._parse(s) # raises
+        return top[0]
 
     @classmethod
-    def parse_sexp(self, s):
-        k, v, pos = self._get(s, 0)
-        k2, _, p = self._token(s, pos)
-        if k2 != 'end':
-            self._raiseerror(s, pos, 'eos detection')
-        return k, v
-
-    @classmethod
-    def get_sexp_val(self, s):
-        l = self.parse_sexp(s)
-        def iter(v):
-            k, v = v
-            if k == 'list':
-                return [iter(e) for e in v]
-            elif k == 'token' or k == 'str':
-                return v
-            elif k == 'num':
-                return int(v)
+    def _parse(self, s):
+        stack = []
+        cur = None
+        done = False
+        pos = 0
+        for mo in self.scanner.finditer(s):
+            if done:
+                self._raiseerror(s, pos, 'eos detection')
+            k = mo.lastindex
+            if k == 1:
+                l = []
+                if cur is not None:
+                    cur.append(l)
+                stack.append(cur)
+                cur = l
+            elif k == 2:
+                if cur is None:
+                    self._raiseerror(s, pos, 1)
+                v = cur
+                cur = stack.pop()
+                if cur is None:
+                    done = True
             else:
-                assert False, 'unknown type'
-        return iter(l)
+                v = mo.group(k)
+                if cur is None:
+                    done = True
+                else:
+                    cur.append(v)
+            pos = mo.end()
+        if not done:
+            self._raiseerror(s, pos, 2)
+        return v
 
 class Romanization:
     dic = """   xa a xi i xu u xe e xo o ka ga ki gi ku gu ke ge ko go
@@ -102,8 +115,28 @@ class Romanization:
                 na ni nu ne no ha ba pa hi bi pi fu bu pu he be pe ho bo po
                 ma mi mu me mo xya ya xyu yu xyo yo ra ri ru re ro xwa wa wi we wo N vu xka xke""".split()
 
+    # Small kana are romanized with a leading 'x'.  The rewrite rules
+    # below only span a kana and following small kana, or a small tsu
+    # and the following kana.  Readings are split into such clusters,
+    # each romanized once by the rules and then looked up from a table.
+    small = 'ァィゥェォッャュョヮヵヶぁぃぅぇぉっゃゅょゎゕゖ'
+    cluster_re = re.compile(r'.(?:(?<=[ッっ]).|[{}])*'.format(small), re.S)
+    table = {}
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1 << 18)
+    def romanization(s):
+        t = Romanization.table
+        o = []
+        for c in Romanization.cluster_re.findall(s):
+            r = t.get(c)
+            if r is None:
+                r = t[c] = Romanization.romanization_by_rules(c)
+            o.append(r)
+        return "".join(o)
+
     @classmethod
-    def romanization(self, s):
+    def romanization_by_rules(self, s):
         dic = self.dic
         l = []
         for ch in s:
@@ -140,6 +173,267 @@ class Romanization:
         l = re.sub(r'N', r'n', l)
         return l
 
+class ConversionCache:
+    """Content-addressed cache of per-entry conversion results.
+
+    Results are kept in an SQLite database in the directory path,
+    keyed by a hash of the converter name, its version, its options
+    and the input entry.  Rebuilds after editing a source only
+    convert the changed entries.  Bump VERSIONS when a converter
+    changes its results."""
+
+    VERSIONS = {'chasen': 1, 'kakasi': 1}
+    FILENAME = 'convert-cache.sqlite3'
+    MISSING = object()
+    # keys per SELECT; below SQLITE_MAX_VARIABLE_NUMBER of old SQLite (999)
+    QUERY_KEYS = 500
+
+    def __init__(self, path, converter, options=None):
+        os.makedirs(path, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(path, self.FILENAME), timeout=60)
+        self.db.execute('CREATE TABLE IF NOT EXISTS results '
+                        '(ns BLOB, key BLOB, value TEXT, PRIMARY KEY (ns, key)) WITHOUT ROWID')
+        self.prefix = json.dumps([converter, self.VERSIONS[converter], options],
+                                 ensure_ascii=False).encode('utf-8') + b'\0'
+        self.ns = hashlib.sha256(self.prefix).digest()
+        self.hits = self.misses = 0
+
+    def _key(self, s):
+        return hashlib.sha256(self.prefix + s.encode('utf-8')).digest()
+
+    def get_many(self, entries):
+        """Returns cached results for entries, or MISSING for each entry not in cache."""
+        keys = [self._key(s) for s in entries]
+        # only the requested keys, in batches
+        found = {}
+        for i in range(0, len(keys), self.QUERY_KEYS):
+            batch = keys[i : i + self.QUERY_KEYS]
+            found.update(self.db.execute(
+                'SELECT key, value FROM results WHERE ns = ? AND key IN ({})'.format(
+                    ','.join('?' * len(batch))), [self.ns] + batch))
+        # decode all values at once
+        values = iter(json.loads('[' + ','.join(found[k] for k in keys if k in found) + ']'))
+        r = [next(values) if k in found else self.MISSING for k in keys]
+        misses = sum(1 for v in r if v is self.MISSING)
+        self.hits += len(keys) - misses
+        self.misses += misses
+        return r
+
+    def put_many(self, pairs):
+        """Stores (entry, result) pairs."""
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?)',
+                                ((self.ns, self._key(s), json.dumps(v, ensure_ascii=False)) for s, v in pairs))
+
+    def close(self):
+        self.db.close()
+
+class _ConverterProcess:
+    # one process of ConverterPool, with its writer and reader threads.
+    def __init__(self, command, pool):
+        self.pool = pool
+        self.queue = queue.Queue(maxsize=2)
+        self.expected = collections.deque()
+        self.closing = False
+
+        slave = None
+        try:
+            import tty
+            master, slave = os.openpty()
+            tty.setraw(slave)
+        except (ImportError, AttributeError, OSError):
+            slave = None
+        self.pty = slave is not None
+
+        self.p = subprocess.Popen(command, shell=True,
+                                  stdin=subprocess.PIPE,
+                                  stdout=(slave if self.pty else subprocess.PIPE))
+        if self.pty:
+            os.close(slave)
+            self.out = os.fdopen(master, 'rb')
+        else:
+            self.out = self.p.stdout
+
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.writer.start()
+        self.reader.start()
+
+    def _write(self):
+        try:
+            while True:
+                b = self.queue.get()
+                if b is None:
+                    break
+                self.expected.extend(seq for seq, l in b)
+                self.p.stdin.write(b''.join(l.encode('utf-8') + b'\n' for seq, l in b))
+                self.p.stdin.flush()
+            self.p.stdin.close()
+        except OSError:
+            pass # reported by the reader
+
+    def _read(self):
+        pool = self.pool
+        try:
+            for line in self.out:
+                seq = self.expected.popleft()
+                with pool.cond:
+                    pool.results[seq] = line.decode('utf-8', errors='replace').rstrip('\r\n')
+                    pool.cond.notify_all()
+        except OSError:
+            pass # EIO: end of output on pseudo-terminals
+        except IndexError:
+            pool._fail('excess output from converter')
+        finally:
+            self.out.close()
+            if not self.closing or self.expected:
+                pool._fail('converter exited with status {}'.format(self.p.wait()))
+
+    def close(self):
+        self.closing = True
+        self.queue.put(None)
+        self.writer.join()
+        self.reader.join()
+        self.p.wait()
+
+class ConverterPool:
+    """Runs a line-oriented filter command (like kakasi) as persistent processes.
+
+    map() sends lines in batches to the processes in turn, and yields
+    the output lines in input order; each input line must produce
+    exactly one output line.  At most `window` lines are in flight,
+    so that memory stays bounded and the input is read only as fast
+    as the processes convert it.
+
+    Outputs are read through pseudo-terminals where available, which
+    makes stdio-based filters line-buffered.  Otherwise a filter may
+    hold back its output until end of input, so each map() reads its
+    whole input and restarts the processes."""
+
+    def __init__(self, command, procs=1, batch=256, window=None):
+        self.command = command
+        self.nprocs = procs
+        self.batch = batch
+        self.window = window or procs * batch * 4
+        self.cond = threading.Condition()
+        self.results = {}
+        self.failed = None
+        self.seq = 0
+        self.procs = []
+
+    def _fail(self, reason):
+        with self.cond:
+            self.failed = self.failed or reason
+            self.cond.notify_all()
+
+    def map(self, lines):
+        if not self.procs:
+            self.procs = [_ConverterProcess(self.command, self) for i in range(self.nprocs)]
+        persistent = all(p.pty for p in self.procs)
+        window = self.window if persistent else None
+
+        lines = iter(lines)
+        out = fed = self.seq
+        eof = False
+        rr = 0
+        while True:
+            while not eof and (window is None or fed - out < window):
+                b = [(fed + i, l) for i, l in enumerate(itertools.islice(lines, self.batch))]
+                if not b:
+                    eof = True
+                    if not persistent:
+                        for p in self.procs:
+                            p.closing = True
+                            p.queue.put(None)
+                    break
+                self.procs[rr % len(self.procs)].queue.put(b)
+                rr += 1
+                fed += len(b)
+            if eof and out == fed:
+                break
+            with self.cond:
+                while out not in self.results and not self.failed:
+                    self.cond.wait()
+                if self.failed:
+                    raise RuntimeError(self.failed)
+                r = self.results.pop(out)
+            out += 1
+            self.seq = out
+            yield r
+        if not persistent:
+            self.close()
+
+    def close(self):
+        for p in self.procs:
+            p.close()
+        self.procs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            for p in self.procs:
+                p.closing = True
+                p.p.kill()
+        self.close()
+
+CHASEN_CHUNK = 4096
+KAKASI_CHUNK = 65536
+
+def _process_chasen_chunk(args):
+    """Parse and romanize a chunk of chasen dictionary lines.
+
+    Returns for each line either [cost, word, reading], None for
+    filtered lines, or a string describing a parse error;
+    run in worker processes."""
+    lines, (includes, excludes, hiragana_penalty) = args
+    out = []
+    for s in lines:
+        try:
+            l = Sexp.get_sexp_val('(' + s + ')')
+            if len(l) != 2:
+                raise ValueError("l!=2")
+            l = [l[0]] + l[1]
+            l = dict(l)
+            k, p, h, cost = l['見出し語'], l['読み'], l['品詞'], 999999
+            f = False
+            if len(includes):
+                for h0 in h:
+                    if h0 in includes:
+                        f = True
+                        break
+            else:
+                f = True
+            if len(excludes):
+                for h0 in h:
+                    if h0 in excludes:
+                        f = False
+                        break
+            if not f:
+                out.append(None)
+                continue
+            if type(k) == list:
+                if len(k) == 2:
+                    k, cost = k
+                    cost = int(cost)
+                else:
+                    raise ValueError("len(k) != 2")
+            if p[0] == '{':
+                p = p[1:].partition('/')[0]
+
+            nh = 0
+            for c in k:
+                if 'ぁ' <= c < 'ん':
+                    nh += 1
+            cost += nh * hiragana_penalty // len(k)
+
+            r = Romanization.romanization(p)
+            out.append([cost, k, r])
+        except ValueError as e:
+            out.append(repr(e))
+    return out
+
 def fname_relative(base, fname):
     if fname == '':
         return base
@@ -181,15 +475,15 @@ def extract_copyright(fname, section, quote = "# "):
         return "".join(o)
 
 def password_ok(s):
-    return bool(re.fullmatch(r"\A[A-Za-z']+\Z", s))
+    # inner hyphens are for words like "X-ray" in the ICAO alphabet.
+    return bool(re.fullmatch(r"\A[A-Za-z']+(?:-[A-Za-z']+)*\Z", s))
 
 class CorpusConvert:
-    @staticmethod
-    def process_kakasi(src, fname, boilerplate):
-        buf = []
-        pbuf = []
-        out = []
+    KAKASI = "kakasi -iutf8 -outf8 -rh -Ja -Ha"
 
+    @staticmethod
+    def _kakasi_entries(src):
+        # (hint, text to convert) pairs
         for line in src:
             line = line.strip()
             if line == '': continue
@@ -197,55 +491,79 @@ class CorpusConvert:
             mo = re.match(r'^([a-z\']+) +\[([^ -~]+)\]$', line)
             if mo:
                 en, jp = mo.group(1, 2)
-                pbuf.append("{} {}".format(len(buf), en))
-                buf.append(jp)
+                yield (jp, en)
             else:
                 for w in line.split(' '):
                     mo = re.match(r'^([^ -~]+)$', w)
                     if mo:
-                        pbuf.append("{} {}".format(len(buf), w))
-                        buf.append(w)
+                        yield (w, w)
                     else:
                         pass
                         #out.append("## {}".format(w))
 
-        with ExitStack() as stack:
-            p = stack.enter_context(
-                subprocess.Popen("kakasi -iutf8 -outf8 -rh -Ja -Ha",
-                                 shell=True,
-                                 stdin=subprocess.PIPE,
-                                 stdout=subprocess.PIPE))
-            def pf():
-                for a in pbuf:
-                    p.stdin.write(a.encode('utf-8') + b'\n')
-                p.stdin.close()
-
-            t = threading.Thread(target=pf, daemon=True)
-            t.start()
-
-            src = io.TextIOWrapper(p.stdout, encoding='utf-8', errors='substitute')
-            os = {}
-
-            for line in src:
-                line = line.strip()
-                mo = re.match(r'^(\d+) ([a-z\']+)$', line)
-                if not mo:
-                    out.append("### " + line)
-                    continue
-                n, ro = mo.group(1, 2)
-                n = int(n)
-                # ro = re.sub(r'n([m])', r'm\1', ro)  # [bpm]
-                ro = re.sub(r'\'', r'', ro)
-                if ro in os:
-                    out.append("## {}\t{}\t{}".format(ro, buf[n], os[ro]))
+    @classmethod
+    def process_kakasi(self, src, fname, boilerplate, jobs=1, diag=False, cache=None):
+        if not jobs:
+            jobs = os.cpu_count() or 1
+        if cache:
+            cache = ConversionCache(cache, 'kakasi', self.KAKASI)
+        t = time.perf_counter()
+
+        out = []
+        seen = {}
+        n = nconv = 0
+        entries = self._kakasi_entries(src)
+        with ConverterPool(self.KAKASI, procs=jobs) as pool:
+            while True:
+                chunk = list(itertools.islice(entries, KAKASI_CHUNK))
+                if not chunk:
+                    break
+                if cache:
+                    results = cache.get_many([en for jp, en in chunk])
                 else:
-                    os[ro] = buf[n]
-                    out.append((ro, buf[n]))
+                    results = [ConversionCache.MISSING] * len(chunk)
+                todo = [i for i, r in enumerate(results) if r is ConversionCache.MISSING]
+                nconv += len(todo)
+
+                errors = {}
+                conv = pool.map("{} {}".format(n + i, chunk[i][1]) for i in todo)
+                for i, line in zip(todo, conv):
+                    line = line.strip()
+                    mo = re.match(r'^(\d+) ([a-z\']+)$', line)
+                    if mo and int(mo.group(1)) == n + i:
+                        results[i] = mo.group(2)
+                    else:
+                        errors[i] = "### " + line
+
+                if cache:
+                    cache.put_many((chunk[i][1], results[i]) for i in todo if i not in errors)
+
+                for i, ro in enumerate(results):
+                    if i in errors:
+                        out.append(errors[i])
+                        continue
+                    # ro = re.sub(r'n([m])', r'm\1', ro)  # [bpm]
+                    ro = re.sub(r'\'', r'', ro)
+                    jp = chunk[i][0]
+                    if ro in seen:
+                        out.append("## {}\t{}\t{}".format(ro, jp, seen[ro]))
+                    else:
+                        seen[ro] = jp
+                        out.append((ro, jp))
+                n += len(chunk)
+
+        if cache:
+            cache.close()
+        if diag:
+            t = time.perf_counter() - t
+            print("kakasi: converted {} words in {:.3f} sec ({:.0f} words/sec, {} processes{})".format(
+                n, t, n / t, jobs,
+                ", {} cached".format(n - nconv) if cache else ""), file=sys.stderr)
 
-            return (boilerplate, out)
+        return (boilerplate, out)
 
     @staticmethod
-    def process_chasen(src, fname, boilerplate):
+    def process_chasen(src, fname, boilerplate, jobs=1, diag=False, cache=None):
         config = {}
         for l in src:
             k, s, v = l.strip().partition(' ')
@@ -255,78 +573,76 @@ class CorpusConvert:
         dic_fname = fname_relative(fname, config['input'])
         copyright = extract_copyright(fname_relative(fname, config['copyright']), config['copyright_section'])
 
-        includes = config.get('includes', "").split()
-        excludes = config.get('excludes', "").split()
-        hiragana_penalty = int(config.get('hiragana-penalty', 0))
+        options = (config.get('includes', "").split(),
+                   config.get('excludes', "").split(),
+                   int(config.get('hiragana-penalty', 0)))
 
         out = []
 
         with open(dic_fname, encoding='utf-8') as dic:
-            words = []
-            lno = 0
-            for s in dic:
-                lno += 1
-                try:
-                    l = Sexp.get_sexp_val('(' + s + ')')
-                    if len(l) != 2:
-                        raise ValueError("l!=2")
-                    l = [l[0]] + l[1]
-                    l = dict(l)
-                    k, p, h, cost = l['見出し語'], l['読み'], l['品詞'], 999999
-                    f = False
-                    g = False
-                    if len(includes):
-                        for h0 in h:
-                            if h0 in includes:
-                                f = True
-                                break
-                    else:
-                        f = True
-                    if len(excludes):
-                        for h0 in h:
-                            if h0 in excludes:
-                                f = False
-                                break
-                    if not f:
-                        continue
-                    if type(k) == list:
-                        if len(k) == 2:
-                            k, cost = k
-                            cost = int(cost)
-                        else:
-                            raise ValueError("len(k) != 2")
-                    if p[0] == '{':
-                        p = p[1:].partition('/')[0]
-
-                    nh = 0
-                    for c in k:
-                        if 'ぁ' <= c < 'ん':
-                            nh += 1
-                    cost += nh * hiragana_penalty // len(k)
-                    
-                    r = Romanization.romanization(p)
-                    words.append([cost, k, r])
-                except ValueError as e:
-                    out.append("### " + s.strip())
-                    out.append("#### " + str(lno) + ": " + repr(e))
-
-            wdic = {}
-
-            for cost, k, r in sorted(words):
-                if re.search('[a-zA-Zａ-ｚＡ-Ｚァ-ヾ]', k) or '*' in r or '-' in r or 'x' in r or r == '':
-                    #rest.append("## {}\t{}".format(r, k))
-                    continue
-                if r not in wdic:
-                    wdic[r] = k
-                    out.append((r, k))
-                else:
-                    out.append("# {}\t{}\t<- {}".format(r, k, wdic.get(r)))
+            lines = dic.readlines()
+
+        if not jobs:
+            jobs = os.cpu_count() or 1
+        t = time.perf_counter()
+
+        if cache:
+            cache = ConversionCache(cache, 'chasen', options)
+            results = cache.get_many(lines)
+        else:
+            results = [ConversionCache.MISSING] * len(lines)
+        todo = [i for i, r in enumerate(results) if r is ConversionCache.MISSING]
+
+        # parse and romanize in chunks; results are merged in input order.
+        chunks = [([lines[j] for j in todo[i:i + CHASEN_CHUNK]], options)
+                  for i in range(0, len(todo), CHASEN_CHUNK)]
+        if jobs == 1 or len(chunks) <= 1:
+            converted = map(_process_chasen_chunk, chunks)
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+            converted = executor.map(_process_chasen_chunk, chunks)
+
+        i = 0
+        for c in converted:
+            for r in c:
+                results[todo[i]] = r
+                i += 1
+        if jobs != 1 and len(chunks) > 1:
+            executor.shutdown()
+        if cache:
+            cache.put_many((lines[j], results[j]) for j in todo)
+            cache.close()
+
+        words = []
+        for lno, r in enumerate(results, 1):
+            if type(r) is str:
+                out.append("### " + lines[lno - 1].strip())
+                out.append("#### " + str(lno) + ": " + r)
+            elif r is not None:
+                words.append(r)
 
-            return (boilerplate + copyright, out)
+        if diag:
+            t = time.perf_counter() - t
+            print("chasen: converted {} lines in {:.3f} sec ({:.0f} lines/sec, {} jobs{})".format(
+                len(lines), t, len(lines) / t, jobs,
+                ", {} cached".format(len(lines) - len(todo)) if cache else ""), file=sys.stderr)
+
+        wdic = {}
+
+        for cost, k, r in sorted(words):
+            if re.search('[a-zA-Zａ-ｚＡ-Ｚァ-ヾ]', k) or '*' in r or '-' in r or 'x' in r or r == '':
+                #rest.append("## {}\t{}".format(r, k))
+                continue
+            if r not in wdic:
+                wdic[r] = k
+                out.append((r, k))
+            else:
+                out.append("# {}\t{}\t<- {}".format(r, k, wdic.get(r)))
+
+        return (boilerplate + copyright, out)
 
     @staticmethod
-    def process_plain(src, fname, boilerplate):
-        wset = set()
+    def _plain_entries(src):
         for l in src:
             l = l.strip()
             if l.startswith('#'):
@@ -335,11 +651,21 @@ class CorpusConvert:
                 continue
             if ' ' in l:
                 raise ValueError('plain corpus: bad input: ' + l)
-            wset.add((l, l))
-        return boilerplate, list(wset)
+            yield (l, l)
+
+    @classmethod
+    def process_plain(self, src, fname, boilerplate, jobs=1, diag=False, cache=None):
+        return boilerplate, list(set(self._plain_entries(src)))
+
+    # stream_* processors return an iterator instead of a list,
+    # for save_compact_corpus_external.
+
+    @classmethod
+    def stream_plain(self, src, fname, boilerplate, jobs=1, diag=False, cache=None):
+        return boilerplate, self._plain_entries(src)
 
     @staticmethod
-    def process_hinted(src, fname, boilerplate):
+    def process_hinted(src, fname, boilerplate, jobs=1, diag=False, cache=None):
         # process boilerplate
         b = boilerplate.rstrip('\n').split('\n')
         bt = BOILERPLATE.rstrip('\n').split('\n')
@@ -385,7 +711,8 @@ class CorpusConvert:
         return boilerplate, out
 
     @classmethod
-    def convert(self, fname, ofname, debug=False):
+    def convert(self, fname, ofname, debug=False, jobs=1, external=False, tmpdir=None,
+                compress=None, block_entries=None, cache=None):
         hdr = ""
         processor = None
         with open(fname, encoding='utf-8') as src:
@@ -405,17 +732,37 @@ class CorpusConvert:
                     else:
                         raise RuntimeError("Unkown header:", p)
             fun = getattr(self, 'process_' + processor)
+            if external:
+                fun = getattr(self, 'stream_' + processor, fun)
             b = BOILERPLATE + "\n" + hdr
-            b, dic = fun(src, fname, boilerplate = b)
+            b, dic = fun(src, fname, boilerplate = b, jobs = jobs, diag = debug, cache = cache)
+
+            if external:
+                with open(ofname, 'wb') as dest:
+                    save_compact_corpus_external(dest, dic, boilerplate=b, tmpdir=tmpdir)
+                return
+
             check_dict_content(dic)
 
             with open(ofname, 'wb') as dest:
-                save_compact_corpus(dest, dic, boilerplate=b)
+                save_compact_corpus(dest, dic, boilerplate=b,
+                                    compress=compress, block_entries=block_entries or BLOCK_ENTRIES)
 
             if debug:
                 with open(ofname + '.txt', 'w', encoding='utf-8') as dest:
                     save_hinted_corpus(dest, dic, boilerplate=b)
 
+    @classmethod
+    def convert_many(self, pairs, parallel=None, **kwargs):
+        """Converts several (input, output) pairs concurrently.
+
+        Conversions mostly wait for kakasi or worker processes,
+        so threads are enough here."""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=parallel or len(pairs)) as executor:
+            futures = [executor.submit(self.convert, i, o, **kwargs) for i, o in pairs]
+        for f in futures:
+            f.result()
+
 def check_dict_content(dic, cause='internal'):
     s = set()
     for e in dic:
@@ -443,9 +790,50 @@ def save_hinted_corpus(of, coll, boilerplate = ""):
                 i = '#' + i
             print(i, file=of)
 
-def save_compact_corpus(ob, coll, boilerplate = None, rest=None):
+# version: (magic line, first index line, index line)
+PACKED_FORMATS = {
+    CompactedCorpus.VERSION: (b'#!!PCK!! %08x %08x %08x %08x %08x !\n', b'%07x\n', b'%07x %07x\n'),
+    CompactedCorpus.VERSION_WIDE: (b'#!!PCK!! %08x %08x %016x %016x %016x !\n', b'%016x\n', b'%016x %016x\n'),
+}
+PACKED_FORMATS[CompactedCorpus.VERSION_BLOCKS] = PACKED_FORMATS[CompactedCorpus.VERSION_WIDE]
+
+BLOCK_ENTRIES = 64
+
+def _compressor(codec):
+    if codec == 'zlib':
+        return lambda b: zlib.compress(b, 9)
+    elif codec == 'lzma':
+        import lzma
+        return functools.partial(lzma.compress, format=lzma.FORMAT_RAW,
+                                 filters=CompactedCorpus.LZMA_FILTERS)
+    raise ValueError('unknown compression {!r}'.format(codec))
+
+def compress_blocks(coll, codec, block_entries = BLOCK_ENTRIES, rest = b''):
+    """Returns a block-compressed data section for sorted entries in coll."""
+    compress = _compressor(codec)
+    blocks = []
+    rawlen = 0
+    for i in range(0, len(coll), block_entries):
+        b = b''.join(k + h for k, h in coll[i : i + block_entries])
+        rawlen += len(b)
+        blocks.append(compress(b))
+    if rest:
+        rawlen += len(rest)
+        blocks.append(compress(rest))
+
+    out = bytearray(b'%-4s %08x %016x %016x\n' % (codec.encode('ascii'), block_entries, rawlen, len(blocks)))
+    assert(len(out) == CompactedCorpus.BLOCKINFO_LEN)
+    p = 0
+    out.extend(b'%016x\n' % (p,))
+    for b in blocks:
+        p += len(b)
+        out.extend(b'%016x\n' % (p,))
+    for b in blocks:
+        out.extend(b)
+    return out
+
+def save_compact_corpus(ob, coll, boilerplate = None, rest=None, compress=None, block_entries=BLOCK_ENTRIES):
     MAGIC = CompactedCorpus.MAGIC
-    VERSION = CompactedCorpus.VERSION
 
     coll2 = []
     for i in coll:
@@ -463,38 +851,20 @@ def save_compact_corpus(ob, coll, boilerplate = None, rest=None):
     else:
         boilerplate = b''
 
-    dat = bytearray()
-    ptr = bytearray()
-    ptr.extend(b'%07x\n' % (MAGIC,))
-
-    p = 0
-
-    # detect common postfix strings to share
-    words = {}
-    for k, v in coll:
-        words[k] = None
-        words[v] = None
-    l = sorted(words.keys(), key=(lambda v: [*reversed(v), 256]))
-
-    p = 0
-    for i in l:
-        if words[i] != None:
-            continue
-        dat.extend(i)
-        for ss in range(len(i)):
-            if i[ss:] in words:
-                words[i[ss:]] = p + ss
-        p += len(i)
-
-    for i in range(ll):
-        k, h = coll[i]
-        ptr.extend(b'%07x %07x\n' % (words[k], words[h]))
-
     if rest:
-        dat.extend(rest.encode('utf-8', errors='substitute') + b'\n')
+        rest = rest.encode('utf-8', errors='substitute') + b'\n'
 
-    s = b'#!!PCK!! %08x %08x %08x %08x %08x !\n' % (MAGIC, VERSION, len(boilerplate), len(dat), ll)
-    assert(len(s) == 56)
+    if compress:
+        VERSION = CompactedCorpus.VERSION_BLOCKS
+        fmt_magic, fmt_head, fmt_idx = PACKED_FORMATS[VERSION]
+        dat = compress_blocks(coll, compress, block_entries, rest)
+        ptr = fmt_head % (MAGIC,)
+    else:
+        dat, ptr, VERSION = _pack_shared(coll, boilerplate, rest)
+        fmt_magic = PACKED_FORMATS[VERSION][0]
+
+    s = fmt_magic % (MAGIC, VERSION, len(boilerplate), len(dat), ll)
+    assert(len(s) == CompactedCorpus.LAYOUT[VERSION][0])
 
     ob.write(CompactedCorpus.HEADER)
     ob.write(s)
@@ -504,14 +874,204 @@ def save_compact_corpus(ob, coll, boilerplate = None, rest=None):
     ob.write(ptr)
     ob.write(CompactedCorpus.HEADER2)
 
+def _pack_shared(coll, boilerplate, rest):
+    ll = len(coll)
+    dat = bytearray()
+
+    # share common postfix strings.
+    # Sorting by reversed strings, each string comes right after every
+    # string having it as a postfix, so it is enough to compare it
+    # with the previous one.  b'\xff' never appears in UTF-8, and
+    # makes a string sort after its own extensions.  Keys tie only for
+    # equal strings, which share one offset; each string points into
+    # the last string written before it, so offsets are the same as
+    # those of the previous quadratic packer.
+    strs = [s for kh in coll for s in kh]
+    order = sorted(range(len(strs)), key=(lambda j: strs[j][::-1] + b'\xff'))
+    offs = [0] * len(strs)
+
+    p = 0
+    prev, prevp = b'', 0
+    for j in order:
+        i = strs[j]
+        if prev.endswith(i):
+            prevp = prevp + len(prev) - len(i)
+        else:
+            dat.extend(i)
+            prevp = p
+            p += len(i)
+        offs[j] = prevp
+        prev = i
+
+    if rest:
+        dat.extend(rest)
+
+    # the wide format is used only when v3 cannot hold the corpus
+    VERSION = CompactedCorpus.VERSION
+    if len(boilerplate) + len(dat) + (ll * 2 + 1) * 8 + 128 > CompactedCorpus.MAXSIZE:
+        VERSION = CompactedCorpus.VERSION_WIDE
+    fmt_magic, fmt_head, fmt_idx = PACKED_FORMATS[VERSION]
+
+    ptr = bytearray()
+    ptr.extend(fmt_head % (CompactedCorpus.MAGIC,))
+    for i in range(ll):
+        ptr.extend(fmt_idx % (offs[2 * i], offs[2 * i + 1]))
+
+    return dat, ptr, VERSION
+
+EXTERNAL_RUN_SIZE = 1 << 26
+
+def _sorted_runs(coll, tmpdir, run_size):
+    # sort entries into files of about run_size bytes of memory each.
+    runs = []
+    buf = []
+    size = 0
+    def flush():
+        fn = os.path.join(tmpdir, 'run{}'.format(len(runs)))
+        buf.sort()
+        with open(fn, 'wb') as f:
+            f.writelines(buf)
+        runs.append(fn)
+        buf.clear()
+
+    for e in coll:
+        if type(e) is str:
+            continue # unused/unrecognized entry
+        k, h = e
+        if not password_ok(k):
+            raise ValueError('internal error: bad word {!r} in generated dictionary'.format(k))
+        if '\t' in h or '\n' in h:
+            raise ValueError('internal error: bad hint {!r} in generated dictionary'.format(h))
+        e = (k + '\t' + h + '\n').encode('utf-8')
+        buf.append(e)
+        size += len(e) + 64 # object overhead
+        if size >= run_size:
+            flush()
+            size = 0
+    if buf:
+        flush()
+    return runs
+
+def save_compact_corpus_external(ob, coll, boilerplate = None, rest=None,
+                                 run_size=EXTERNAL_RUN_SIZE, tmpdir=None):
+    """Streaming version of save_compact_corpus() for word lists larger
+    than memory.
+
+    Entries are sorted by external merge sort over temporary files,
+    and duplicated words are dropped, keeping the smallest hint.
+    The output is always in the wide format, and is written
+    incrementally; ob must be seekable.  Only hints identical to the
+    word or to the previous hint are shared."""
+
+    MAGIC = CompactedCorpus.MAGIC
+    VERSION = CompactedCorpus.VERSION_WIDE
+    fmt_magic, fmt_head, fmt_idx = PACKED_FORMATS[VERSION]
+
+    if boilerplate:
+        boilerplate = boilerplate.encode('utf-8') + b'\n'
+    else:
+        boilerplate = b''
+
+    with tempfile.TemporaryDirectory(dir=tmpdir) as td, ExitStack() as stack:
+        runs = [stack.enter_context(open(fn, 'rb'))
+                for fn in _sorted_runs(coll, td, run_size)]
+        ptr = stack.enter_context(open(os.path.join(td, 'index'), 'w+b'))
+        ptr.write(fmt_head % (MAGIC,))
+
+        ob.write(CompactedCorpus.HEADER)
+        hpos = ob.tell()
+        ob.write(fmt_magic % (MAGIC, VERSION, 0, 0, 0))
+        ob.write(boilerplate)
+        ob.write(CompactedCorpus.HEADER2)
+
+        p = 0
+        ll = 0
+        prevk = prevh = None
+        prevhp = 0
+        # '\t' sorts before any word character, so entries come
+        # in the same order as save_compact_corpus() writes them.
+        for e in heapq.merge(*runs):
+            k, _, h = e.partition(b'\t')
+            if k == prevk:
+                continue
+            prevk = k
+            k += b'\n'
+            ob.write(k)
+            kp = p
+            p += len(k)
+            if h == k:
+                hp = kp
+            elif h == prevh:
+                hp = prevhp
+            else:
+                ob.write(h)
+                hp = p
+                p += len(h)
+            prevh, prevhp = h, hp
+            ptr.write(fmt_idx % (kp, hp))
+            ll += 1
+
+        if ll < 2:
+            raise ValueError('internal error: only {} word in generated dictionary'.format(ll))
+
+        if rest:
+            rest = rest.encode('utf-8', errors='substitute') + b'\n'
+            ob.write(rest)
+            p += len(rest)
+
+        ptr.seek(0)
+        shutil.copyfileobj(ptr, ob)
+        ob.write(CompactedCorpus.HEADER2)
+
+        end = ob.tell()
+        ob.seek(hpos)
+        ob.write(fmt_magic % (MAGIC, VERSION, len(boilerplate), p, ll))
+        ob.seek(end)
+
 if __name__ == '__main__':
     import argparse
 
     parser = argparse.ArgumentParser(description='compile corpus')
     parser.add_argument('--debug', '--diag', action='store_true')
-    parser.add_argument('input')
-    parser.add_argument('output')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--external', action='store_true',
+                        help='sort on disk with bounded memory, for very large word lists')
+    parser.add_argument('--tmpdir', default=None,
+                        help='directory for temporary files of --external')
+    parser.add_argument('--compress', choices=('zlib', 'lzma'), default=None,
+                        help='compress the data section in blocks')
+    parser.add_argument('--block-entries', type=int, default=BLOCK_ENTRIES,
+                        help='entries per compressed block (default: %(default)s)')
+    parser.add_argument('--kakasi', metavar='COMMAND', default=None,
+                        help='kakasi command line (default: {!r})'.format(CorpusConvert.KAKASI))
+    parser.add_argument('--cache', metavar='DIR', default=None,
+                        help='keep per-entry conversion results in DIR for later rebuilds')
+    parser.add_argument('-d', '--output-dir', metavar='DIR', default=None,
+                        help='convert all inputs into DIR/<name>.corpus concurrently')
+    parser.add_argument('-P', '--parallel', type=int, default=None,
+                        help='number of corpora converted at once with --output-dir')
+    parser.add_argument('files', nargs='+', metavar='input output',
+                        help='input and output files, or input files with --output-dir')
 
     opts = parser.parse_args()
+    if opts.compress and opts.external:
+        parser.error('--compress cannot be used with --external')
+
+    if opts.kakasi:
+        CorpusConvert.KAKASI = opts.kakasi
+
+    if opts.output_dir != None:
+        pairs = [(f, os.path.join(opts.output_dir,
+                                  os.path.splitext(os.path.basename(f))[0] + '.corpus'))
+                 for f in opts.files]
+    elif len(opts.files) == 2:
+        pairs = [tuple(opts.files)]
+    else:
+        parser.error('give an input and an output file, or --output-dir')
 
-    CorpusConvert.convert(opts.input, opts.output, debug=opts.debug)
+    CorpusConvert.convert_many(pairs, parallel=opts.parallel,
+                               debug=opts.debug, jobs=opts.jobs,
+                               external=opts.external, tmpdir=opts.tmpdir,
+                               compress=opts.compress, block_entries=opts.block_entries,
+                               cache=opts.cache)
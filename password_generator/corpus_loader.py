@@ -1,4 +1,7 @@
 import sys, io, os
+import mmap
+import functools
+import zlib
 import re
 from collections.abc import Sequence as abcSequence
 from contextlib import ExitStack
@@ -62,11 +65,25 @@ def load_compact_corpus(*args, **kwargs):
 class CompactedCorpus(password_generator.WordsCorpusBase):
     MAGIC = 0x3b9c787 # 7digits
     VERSION = 3
+    VERSION_WIDE = 4
+    VERSION_BLOCKS = 5
     HEADER = b'#format packed\n'
     HEADER2 = b'#_-_-_-\n'
     MAXSIZE = 104857600
-
-    def __init__(self, f, load_header=True, name="", errorclass=RuntimeError):
+    # version: (length of magic line, width of index fields)
+    LAYOUT = {VERSION: (56, 8), VERSION_WIDE: (80, 17), VERSION_BLOCKS: (80, 17)}
+    # Block-compressed data section (VERSION_BLOCKS):
+    #   codec, entries per block, uncompressed length and number of
+    #   blocks (BLOCKINFO_LEN bytes), nblocks + 1 block offsets
+    #   (%016x\n), and the compressed blocks, each holding lines of
+    #   words and hints for a fixed number of entries.
+    # The index section has the magic number only.
+    BLOCKINFO_LEN = 48
+    BLOCK_CACHE = 16
+    # raw LZMA2 streams: blocks are small, and need no container headers
+    LZMA_FILTERS = [{'id': 0x21, 'preset': 9, 'dict_size': 1 << 16}] # FILTER_LZMA2
+
+    def __init__(self, f, load_header=True, name="", errorclass=RuntimeError, use_mmap=True):
         self.name = name
 
         def _mustread(s, reason = None, excess = 0):
@@ -100,8 +117,6 @@ class CompactedCorpus(password_generator.WordsCorpusBase):
             load_header = True
         try:
             size = os.fstat(f.fileno()).st_size
-            if size > self.MAXSIZE:
-                raise errorclass('too large corpus: safety valve triggered')
         except io.UnsupportedOperation:
             size = -1
 
@@ -112,7 +127,7 @@ class CompactedCorpus(password_generator.WordsCorpusBase):
                 s = f.read(1)
 
         try:
-            s = f.readline(56)
+            s = f.readline(128)
             a = s.split(b' ')
             if len(a) < 3 or a[0] != b'#!!PCK!!':
                 raise errorclass('bad corpus: bad magic line {}'.format(s))
@@ -120,10 +135,12 @@ class CompactedCorpus(password_generator.WordsCorpusBase):
             if int(a[1], 16) != self.MAGIC:
                 raise errorclass('bad corpus: bad magic {:08x}'.format(int(a[1], 16)))
 
-            if int(a[2], 16) != self.VERSION:
-                raise errorclass('bad corpus: corpus format version mismatch ({} instead of {})'.format(int(a[2], 16), self.VERSION))
+            version = int(a[2], 16)
+            if version not in self.LAYOUT:
+                raise errorclass('bad corpus: corpus format version mismatch ({} instead of {})'.format(version, self.VERSION))
+            slen, self.idxw = self.LAYOUT[version]
 
-            if len(s) != 56 or len(a) != 7 or a[6] != b'!\n':
+            if len(s) != slen or len(a) != 7 or a[6] != b'!\n':
                 raise errorclass('bad corpus: bad magic line {}'.format(s))
 
             blen, datlen, l = int(a[3], 16), int(a[4], 16), int(a[5], 16)
@@ -133,23 +150,54 @@ class CompactedCorpus(password_generator.WordsCorpusBase):
 
         self.l = l
 
-        tbllen = (l * 2 + 1) * 8
+        tbllen = (l * 2 + 1 if version != self.VERSION_BLOCKS else 1) * self.idxw
+
+        # wide corpora are only bounded by what their header declares
+        if version == self.VERSION and size > self.MAXSIZE:
+            raise errorclass('too large corpus: safety valve triggered')
+        if size >= 0 and blen + datlen + tbllen > size:
+            raise errorclass('bad corpus: truncated data')
 
         if blen:
             _mustread(blen, "at comment section")
 
         _mustread(self.HEADER2, "at second signature")
 
-        dat = _mustread(datlen, "at data section")
-        self.dat = dat
-
-        tbl = _mustread(tbllen, "at index section")
-        self.tbl = tbl
+        # Corpora in plain files are mapped instead of being read,
+        # so that loading does not depend on the corpus size.
+        m = None
+        if use_mmap and size > 0:
+            try:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                m = None
+
+        if m is not None:
+            self.dat = self.tbl = m
+            self.datpos = f.tell()
+            self.tblpos = self.datpos + datlen
+            d = m[self.tblpos + tbllen:]
+            if len(d) < len(self.HEADER2):
+                raise errorclass('bad corpus: truncated data at final signature')
+            elif d != self.HEADER2:
+                raise errorclass('bad corpus: unexpected data (%r) at final signature' % d[:16])
+        else:
+            self.datpos = self.tblpos = 0
+            self.dat = _mustread(datlen, "at data section")
+            self.tbl = _mustread(tbllen, "at index section")
+        self.datend = self.datpos + datlen
 
         if self._getidx(0) != self.MAGIC:
             raise errorclass('bad corpus: bad index magic {:08x}'.format(self._getidx(0)))
 
-        _mustread(self.HEADER2, "at final signature", excess = 1)
+        self.blocks = None
+        if version == self.VERSION_BLOCKS:
+            self._load_blockinfo(datlen, errorclass)
+        elif datlen and self.dat[self.datend - 1 : self.datend] != b'\n':
+            raise errorclass('bad corpus: unterminated data section')
+
+        if m is None:
+            _mustread(self.HEADER2, "at final signature", excess = 1)
 
     def len(self):
         return self.l
@@ -165,13 +213,63 @@ class CompactedCorpus(password_generator.WordsCorpusBase):
         return password_generator.WordTuple(self._get(i * 2 + 1), self._get(i * 2 + 2))
 
     def _getidx(self, i):
-        o = i * 8
-        return int(self.tbl[o : o + 8], 16)
+        o = self.tblpos + i * self.idxw
+        return int(self.tbl[o : o + self.idxw], 16)
         # int accepts \n
 
+    def _load_blockinfo(self, datlen, errorclass):
+        s = self.dat[self.datpos : self.datpos + self.BLOCKINFO_LEN]
+        try:
+            a = s.split(b' ')
+            codec, bl, nblocks = a[0], int(a[1], 16), int(a[3], 16)
+        except (ValueError, IndexError):
+            raise errorclass('bad corpus: bad block header {}'.format(s))
+        if codec == b'zlib':
+            decompress, error = zlib.decompress, zlib.error
+        elif codec == b'lzma':
+            import lzma
+            decompress = functools.partial(lzma.decompress, format=lzma.FORMAT_RAW,
+                                           filters=self.LZMA_FILTERS)
+            error = lzma.LZMAError
+        else:
+            raise errorclass('bad corpus: unknown compression {}'.format(codec))
+        tbl = self.datpos + self.BLOCKINFO_LEN
+        start = tbl + (nblocks + 1) * 17
+        try:
+            if (len(s) != self.BLOCKINFO_LEN or bl <= 0 or nblocks < -(-self.l // bl) or
+                start > self.datend or start + int(self.dat[start - 17 : start], 16) != self.datend):
+                raise ValueError
+        except ValueError:
+            raise errorclass('bad corpus: bad block header {}'.format(s))
+
+        def block(b):
+            o = tbl + b * 17
+            p, q = start + int(self.dat[o : o + 17], 16), start + int(self.dat[o + 17 : o + 34], 16)
+            if not start <= p <= q <= self.datend:
+                raise ValueError('bad corpus: broken block offset {}'.format(b))
+            try:
+                return decompress(self.dat[p:q]).split(b'\n')
+            except error:
+                raise ValueError('bad corpus: broken block {}'.format(b))
+
+        self.blocks = (bl, functools.lru_cache(maxsize=self.BLOCK_CACHE)(block))
+
+    def _get_blocked(self, i):
+        bl, block = self.blocks
+        e, f = divmod(i - 1, 2)
+        b, r = divmod(e, bl)
+        try:
+            return block(b)[r * 2 + f].decode('utf-8')
+        except IndexError:
+            raise ValueError('bad corpus: broken block {}'.format(b))
+
     def _get(self, i):
-        o = self._getidx(i)
-        o2 = self.dat.index(b'\n', o)
+        if self.blocks:
+            return self._get_blocked(i)
+        o = self.datpos + self._getidx(i)
+        o2 = self.dat.find(b'\n', o, self.datend)
+        if o2 < 0:
+            raise ValueError('bad corpus: broken index at {}'.format(i))
         #print("NONLAZY: ({})->{}".format((o,o2), self.dat[o:o2].decode('utf-8')), file=sys.stderr)
         return self.dat[o:o2].decode('utf-8')
 
@@ -11,25 +11,102 @@ from abc import abstractmethod
 from collections import namedtuple
 import collections.abc
 from collections.abc import Sequence as abcSequence
-from random import SystemRandom
 from math import log2, ceil
+from itertools import islice
+import os
 
 VERSION = '1.0'
 
 if sys.hexversion < 0x03050000:
     raise RuntimeError('too old Python found')
 
-R = SystemRandom()
-# SystemRandom _is_ secure from Python 3.3, despite warnings in Python documents.
-# Indeed, the "secrets" module introduced in Python 3.6 is implemented upon SystemRandom.
-
 class BadFormatError(RuntimeError):
     pass
 
-def generate(fspec, count, _fuel=None):
+### Random sources
+
+class RandomSource:
+    """Source of random numbers for passphrase generation."""
+    secure = True
+
+    def getrandbits(self, k):
+        """Return a non-negative integer with <k> random bits."""
+        raise NotImplementedError
+
+    def randrange(self, n):
+        """Return a uniformly-chosen integer in range(n)."""
+        if n <= 0:
+            raise ValueError("empty range for randrange()")
+        # rejection sampling, as random.Random does.
+        k = n.bit_length()
+        r = self.getrandbits(k)
+        while r >= n:
+            r = self.getrandbits(k)
+        return r
+
+# counts forks, so that children do not reuse buffered random octets
+_forks = 0
+def _count_fork():
+    global _forks
+    _forks += 1
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_count_fork)
+
+class OSRandom(RandomSource):
+    """Cryptographically-secure random numbers from os.urandom.
+
+    Same as random.SystemRandom, but octets are read in blocks of
+    <bufsize>.  Octets are taken from the block by an iterator, so
+    that no octet is given twice even among threads.  The block is
+    dropped in forked child processes (and not used before Python 3.7)."""
+
+    def __init__(self, bufsize=4096):
+        self.bufsize = bufsize if hasattr(os, 'register_at_fork') else 0
+        self.it = iter(())
+        self.forks = _forks
+
+    def getrandbits(self, k):
+        if k <= 0:
+            return 0
+        n = (k + 7) // 8
+        if self.forks != _forks:
+            self.it, self.forks = iter(()), _forks
+        if n > self.bufsize:
+            b = os.urandom(n)
+        else:
+            b = bytes(islice(self.it, n))
+            if len(b) < n:
+                self.it = iter(os.urandom(self.bufsize))
+                b += bytes(islice(self.it, n - len(b)))
+        return int.from_bytes(b, 'big') >> (n * 8 - k)
+
+class SeededRandom(RandomSource):
+    """INSECURE deterministic random numbers, for tests and benchmarks only.
+
+    Passphrases from this source are reproducible from the seed,
+    and must never be used.  generate() refuses it unless called
+    with _insecure=True."""
+    secure = False
+
+    def __init__(self, seed):
+        import random
+        self.r = random.Random(seed)
+        self.seed = seed
+
+    def __str__(self):
+        return "<INSECURE seeded random: {}>".format(self.seed)
+
+    def getrandbits(self, k):
+        return self.r.getrandbits(k) if k > 0 else 0
+
+# default source for generate() and corpora
+R = OSRandom()
+
+def generate(fspec, count, _fuel=None, rng=None, _insecure=False):
     """Generate <count> number of random passwords/passphrases.
 
-    The passphrases are formated according to <fspec>.
+    The passphrases are formated according to <fspec>,
+    using the RandomSource <rng> (default: OSRandom).
 
     Returned value is (list, json_data),
       where list is a <count>-element sequence of
@@ -42,6 +119,11 @@ def generate(fspec, count, _fuel=None):
     Raises BadFormatError if fspec is either bad or not able to be satisfied.
     """
 
+    if rng == None:
+        rng = R
+    elif not getattr(rng, 'secure', False) and not _insecure:
+        raise RuntimeError("{} is only for tests and benchmarks".format(rng))
+
     diag = []
     fspec, entropy = _parse_fspec(fspec, diag=diag, _fuel=_fuel)
     if count < 1:
@@ -51,6 +133,12 @@ def generate(fspec, count, _fuel=None):
     elements = []
     result = []
 
+    # draw all random words for each element at once
+    # (some corpora have faster bulk generation).
+    pools = [None if getattr(wl, 'is_multiword', False) else
+             iter(wl.get_randomly_bulk(count * ct, rng))
+             for sep, wl, ct in fspec]
+
     for ncount in range(count):
         o = []
 
@@ -63,18 +151,28 @@ def generate(fspec, count, _fuel=None):
             return d
 
         def proc(filling, i, sep, wl, ct):
+            pool = pools[i]
             initial = not filling and i == 0
             e1 = wl.entropy()
 
             if wl.is_words:
                 intersep = sep if sep != None else " "
                 presep = "" if initial else sep if sep != None else " "
-                for c in range(0, ct):
-                    w = wl.get_randomly()
-                    s = presep if c == 0 else intersep
-                    sh = " " if (s == "" and c != 0) else s
-                    if sh: o.append(elem(0.0, True, s, sh, None))
-                    o.append(elem(e1, False, w.word, w.hint, wl))
+                multiword = getattr(wl, 'is_multiword', False)
+                if multiword:
+                    e1 /= wl.password_elements()
+                c = 0
+                for _ in range(0, ct):
+                    if multiword:
+                        ws = wl.get_elements_randomly(rng)
+                    else:
+                        ws = (next(pool),)
+                    for w in ws:
+                        s = presep if c == 0 else intersep
+                        sh = " " if (s == "" and c != 0) else s
+                        if sh: o.append(elem(0.0, True, s, sh, None))
+                        o.append(elem(e1, False, w.word, w.hint, wl))
+                        c += 1
             else:
                 if ct != 0:
                     intersep = ""
@@ -83,7 +181,7 @@ def generate(fspec, count, _fuel=None):
                     ow = []
                     oh = []
                     for c in range(0, ct):
-                        w = wl.get_randomly()
+                        w = next(pool)
                         ow.append(w.word)
                         oh.append(w.hint)
                     o.append(elem(ct * e1, False, "".join(ow), "".join(oh), wl, ct=ct))
@@ -101,12 +199,25 @@ def generate(fspec, count, _fuel=None):
 
 ### TokenParser
 import sys, re, functools
-import inspect
 
 ARGTEST=True
 
 class ParserError(Exception): pass
 
+def _check_arguments(f, names):
+    # same as inspect.signature(f).bind(**names) for plain functions,
+    # without importing inspect.
+    code = f.__code__
+    params = code.co_varnames[:code.co_argcount + code.co_kwonlyargcount]
+    required = params[:code.co_argcount - len(f.__defaults__ or ())]
+    required += tuple(p for p in params[code.co_argcount:] if p not in (f.__kwdefaults__ or {}))
+    for n in names:
+        if n not in params and not code.co_flags & 0x08: # CO_VARKEYWORDS
+            raise TypeError("{}() got an unexpected keyword argument '{}'".format(f.__name__, n))
+    for n in required:
+        if n not in names:
+            raise TypeError("{}() missing a required argument: '{}'".format(f.__name__, n))
+
 def _remove_named_refs(s):
     l = re.split(r'(\\.|\[\^?\]?(?:[^\]\\]|\\.)*\])', s)
     #print(list(enumerate(l)))
@@ -134,7 +245,7 @@ def tokenparser(rex, **kwargs):
                 raise TypeError("keyword argument {} not referenced in pattern".format(a))
     def to_wrap(f):
         if ARGTEST:
-            inspect.signature(f).bind(**robj.groupindex)
+            _check_arguments(f, robj.groupindex)
             # raises TypeError
         @functools.wraps(f)
         def wrapper(s):
@@ -203,8 +314,8 @@ def _parse_fspec(s, *, diag=None, _fuel=None):
     def p_separator(sep1, sep2):
         return sep1 or _remove_backslash(sep2)
 
-    @tokenparser(r'(?P<pat1>[a-zA-Z])|\[(?P<pat2>[\w\-_]+)(\^(?P<subs>[\w_\-]+))?\]')
-    def p_simplecorpus(pat1, pat2, subs):
+    @tokenparser(r'(?P<pat1>[a-zA-Z])|\[(?P<pat2>[\w\-_]+)(\^(?P<subs>[\w_\-]+))?(?P<trans>(\+\w+)*)\]')
+    def p_simplecorpus(pat1, pat2, subs, trans):
         pat = pat1 or pat2
         wl = CorpusList.get_corpus(pat, diag=diag)
 
@@ -215,6 +326,10 @@ def _parse_fspec(s, *, diag=None, _fuel=None):
             elif wl.len() == 1:
                 raise BadFormatError("only one word starting with [{}] in wordset {}".format(subs, pat))
 
+        if trans:
+            for t in trans[1:].split('+'):
+                wl = TransformedCorpus(wl, t)
+
         if wl.len() <= 1:
             raise BadFormatError("not enough candidate in wordset {}".format(subs, pat))
 
@@ -481,14 +596,21 @@ class CorpusBase(abcSequence):
     def password_elements(self):
         return 1
 
-    def get_randomly(self):
+    def get_randomly(self, rng=None):
         """Get a random word with hint from this corpus.
 
+        Random numbers are taken from <rng> (default: R).
         Returns a WordTuple."""
         l = self.len()
         if l < 1:
             raise ValueError("Empty corpus: cannot generate passphrase")
-        return self.get_with_hint(R.randrange(l))
+        return self.get_with_hint((rng or R).randrange(l))
+
+    def get_randomly_bulk(self, count, rng=None):
+        """Get <count> random words with hints from this corpus.
+
+        Returns a list of WordTuples."""
+        return [self.get_randomly(rng) for _ in range(count)]
 
     @abstractmethod
     def get_with_hint(self, i):
@@ -631,6 +753,96 @@ class SubsetCorpus(CorpusBase):
                 return self.d.get_with_hint(i + o)
         assert False
 
+class TransformedCorpus(CorpusBase):
+    """Virtual corpus of words in a base corpus modified by transforms.
+
+    Entry i is the variant i // base.len() of the base word
+    i % base.len().  Available transforms are:
+
+      cap:      the word as is, or with its first letter capitalized.
+      <c><N>:   the word followed by N characters from the character
+                set <c> (e.g. d2 for two digits).
+
+    Words are not sorted; subset and index lookup are unavailable."""
+
+    def __init__(self, base, trans):
+        if not base.is_words:
+            raise BadFormatError("transform {} can only be applied to wordsets".format(trans))
+        self.base = base
+        self.is_words = True
+        self.name = base.name + "+" + trans
+        self.baselen = base.len()
+        mo = re.fullmatch(r'([a-zA-Z])(\d+)', trans)
+        if trans == 'cap':
+            if isinstance(base, TransformedCorpus):
+                raise BadFormatError("transform cap must be applied first")
+            if not ('a' <= base.get_word(0)[0:1] and
+                    base.get_word(self.baselen - 1)[0:1] <= 'z'):
+                # sorted: checking both ends is enough
+                raise BadFormatError("transform cap needs words starting with lowercase alphabets (try [{}^a-z+cap])".format(base.name))
+            self.variants = 2
+            self.transform = self._capitalize
+        elif mo:
+            self.chars = CorpusList.get_corpus(mo.group(1))
+            if self.chars.is_words:
+                raise BadFormatError("transform {}: not a character set".format(trans))
+            self.count = int(mo.group(2))
+            self.variants = self.chars.len() ** self.count
+            self.transform = self._suffix
+        else:
+            raise BadFormatError("unknown transform {}".format(trans))
+
+    def len(self):
+        return self.baselen * self.variants
+
+    def get_with_hint(self, i):
+        if i < 0 or i >= self.len() or int(i) != i:
+            raise IndexError(i)
+        v, b = divmod(i, self.baselen)
+        return self.transform(v, self.base.get_with_hint(b))
+
+    def _capitalize(self, v, w):
+        if v == 0:
+            return w
+        c = w.word[0].upper() + w.word[1:]
+        return WordTuple(c, c if w.hint == w.word else w.hint)
+
+    def _suffix(self, v, w):
+        o, oh = [w.word], [w.hint]
+        l = self.chars.len()
+        for _ in range(self.count):
+            v, d = divmod(v, l)
+            c = self.chars.get_with_hint(d)
+            o.append(c.word)
+            oh.append(c.hint)
+        return WordTuple("".join(o), "".join(oh))
+
+    def subset(self, charset_or_ranges):
+        raise ValueError("transformed corpus is not subsettable")
+
+    def index(self, w):
+        # reverses the transform; raises ValueError if w is not contained.
+        if self.transform == self._capitalize:
+            if w[0:1].islower():
+                return self.base.index(w)
+            c = w[0:1].lower() + w[1:]
+            if c == w:
+                raise ValueError(w)
+            return self.baselen + self.base.index(c)
+        if len(w) <= self.count:
+            raise ValueError(w)
+        v = 0
+        for c in reversed(w[len(w) - self.count:]):
+            v = v * self.chars.len() + self.chars.index(c)
+        return v * self.baselen + self.base.index(w[:len(w) - self.count])
+
+    def __contains__(self, w):
+        try:
+            self.index(w)
+        except ValueError:
+            return False
+        return True
+
 class WordsCorpusBase(CorpusBase):
     is_words = True
 
@@ -695,13 +907,13 @@ class CorpusList:
     def get_corpus(self, target, *, diag=None):
         target = self.shortname_mapping.get(target, target)
         if target in self.corpus_cache:
-            pass
+            return self.corpus_cache[target]
         if target in Charlist.sets:
-            self.corpus_cache[target] = BasicCharacterCorpus(Charlist.sets[target], name=target)
-        elif target in Wordlist.preset_corpus:
-            self.corpus_cache[target] = SimpleWordCorpus(Wordlist.preset_corpus[target], name=target)
+            self.corpus_cache[target] = BasicCharacterCorpus(Charlist.get_set(target), name=target)
         elif target in BuiltinCorpus.builtins:
             self.corpus_cache[target] = BuiltinCorpus.builtins[target]
+        elif BuiltinCorpus.is_arithmetic(target):
+            self.corpus_cache[target] = BuiltinCorpus.get_arithmetic(target)
         else:
             try:
                 if '.' in __name__:
@@ -711,7 +923,10 @@ class CorpusList:
             except ImportError:
                 raise BadFormatError("external corpus support not installed")
 
-            self.corpus_cache[target] = corpus_loader.load_corpus(target, diag=diag, errorclass=BadFormatError)
+            corpus = corpus_loader.load_corpus(Wordlist.preset_corpus.get(target, target),
+                                               diag=diag, errorclass=BadFormatError)
+            corpus.name = target
+            self.corpus_cache[target] = corpus
         return self.corpus_cache[target]
 
 ### Builtin Corpuses
@@ -748,6 +963,7 @@ class Charlist:
     UpperHexadecimal = "0123456789ABCDEF"
     Base32 = Lower + '234567'
     Base32Upper = Upper + '234567'
+    Crockford = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
     # non-ASCII sets
     Hiragana = ("\u3042\u3044\u3046\u3048\u304a\u304b\u304d\u304f\u3051\u3053"
                 "\u3055\u3057\u3059\u305b\u305d\u305f\u3061\u3064\u3066\u3068"
@@ -755,15 +971,15 @@ class Charlist:
                 "\u307e\u307f\u3080\u3081\u3082\u3084\u3086\u3088"
                 "\u3089\u308a\u308b\u308c\u308d\u308f\u3092\u3093")
     Katakana = "".join(chr(0x60 + ord(x)) for x in Hiragana)
-    # annotated sets
-    LowerAlphaNumeric = _annotate(Digits + Lower)
-    AlphaNumeric = _annotate(Digits + Lower + Upper)
-    Base64 = AlphaNumeric + _annotate("+/")
-    Base64_FSSAFE = AlphaNumeric + _annotate("-_")
-    Symbols = _annotate(chr(c) for c in range(33,127))
+    # sets annotated when used (see get_set)
+    LowerAlphaNumeric = Digits + Lower
+    AlphaNumeric = Digits + Lower + Upper
+    Base64 = AlphaNumeric + "+/"
+    Base64_FSSAFE = AlphaNumeric + "-_"
+    Symbols = "".join(chr(c) for c in range(33,127))
     IcaoWordsUpper = [
         "Alfa", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot", "Golf",
-        "Hotel", "India", "Juliett", "Kilo", "Lima", "Mike​", "November",
+        "Hotel", "India", "Juliett", "Kilo", "Lima", "Mike", "November",
         "Oscar", "Papa", "Quebec", "Romeo", "Sierra", "Tango", "Uniform",
         "Victor", "Whiskey", "X-ray", "Yankee", "Zulu" ]
     IcaoWordsLower = [x.lower() for x in IcaoWordsUpper]
@@ -788,338 +1004,24 @@ class Charlist:
         "hiragana": Hiragana,
         "katakana": Katakana
     }
+    annotated = {"lower_alnum", "alnum", "base64", "base64_fssafe", "graph"}
 
-class Wordlist:
+    @classmethod
+    def get_set(self, name):
+        s = self.sets[name]
+        return self._annotate(s) if name in self.annotated else s
 
-    # From https://simple.wikipedia.org/wiki/Wikipedia:Basic_English_ordered_wordlist
-    BasicEnglish ="""
-    I a able about account acid across act addition adjustment
-    advertisement after again against agreement air all almost among
-    amount amusement and angle angry animal answer ant any apparatus
-    apple approval arch argument arm army art as at attack attempt
-    attention attraction authority automatic awake baby back bad bag
-    balance ball band base basin basket bath be beautiful because bed
-    bee before behaviour belief bell bent berry between bird birth bit
-    bite bitter black blade blood blow blue board boat body boiling
-    bone book boot bottle box boy brain brake branch brass bread
-    breath brick bridge bright broken brother brown brush bucket
-    building bulb burn burst business but butter button by cake camera
-    canvas card care carriage cart cat cause certain chain chalk
-    chance change cheap cheese chemical chest chief chin church circle
-    clean clear clock cloth cloud coal coat cold collar colour comb
-    come comfort committee common company comparison competition
-    complete complex condition connection conscious control cook
-    copper copy cord cork cotton cough country cover cow crack credit
-    crime cruel crush cry cup current curtain curve cushion cut damage
-    danger dark daughter day dead dear death debt decision deep degree
-    delicate dependent design desire destruction detail development
-    different digestion direction dirty discovery discussion disease
-    disgust distance distribution division do dog door doubt down
-    drain drawer dress drink driving drop dry dust ear early earth
-    east edge education effect egg elastic electric end engine enough
-    equal error even event ever every example exchange existence
-    expansion experience expert eye face fact fall false family far
-    farm fat father fear feather feeble feeling female fertile fiction
-    field fight finger fire first fish fixed flag flame flat flight
-    floor flower fly fold food foolish foot for force fork form
-    forward fowl frame free frequent friend from front fruit full
-    future garden general get girl give glass glove go goat gold good
-    government grain grass great green grey grip group growth guide
-    gun hair hammer hand hanging happy harbour hard harmony hat hate
-    have he head healthy hearing heart heat help here high history
-    hole hollow hook hope horn horse hospital hour house how humour
-    ice idea if ill important impulse in increase industry ink insect
-    instrument insurance interest invention iron island jelly jewel
-    join journey judge jump keep kettle key kick kind kiss knee knife
-    knot knowledge land language last late laugh law lead leaf
-    learning leather left leg let letter level library lift light like
-    limit line linen lip liquid list little living lock long look
-    loose loss loud love low machine make male man manager map mark
-    market married mass match material may meal measure meat medical
-    meeting memory metal middle military milk mind mine minute mist
-    mixed money monkey month moon morning mother motion mountain mouth
-    move much muscle music nail name narrow nation natural near
-    necessary neck need needle nerve net new news night no noise
-    normal north nose not note now number nut observation of off offer
-    office oil old on only open operation opinion opposite or orange
-    order organization ornament other out oven over owner page pain
-    paint paper parallel parcel part past paste payment peace pen
-    pencil person physical picture pig pin pipe place plane plant
-    plate play please pleasure plough pocket point poison polish
-    political poor porter position possible pot potato powder power
-    present price print prison private probable process produce profit
-    property prose protest public pull pump punishment purpose push
-    put quality question quick quiet quite rail rain range rat rate
-    ray reaction reading ready reason receipt record red regret
-    regular relation religion representative request respect
-    responsible rest reward rhythm rice right ring river road rod roll
-    roof room root rough round rub rule run sad safe sail salt same
-    sand say scale school science scissors screw sea seat second
-    secret secretary see seed seem selection self send sense separate
-    serious servant sex shade shake shame sharp sheep shelf ship shirt
-    shock shoe short shut side sign silk silver simple sister size
-    skin skirt sky sleep slip slope slow small smash smell smile smoke
-    smooth snake sneeze snow so soap society sock soft solid some son
-    song sort sound soup south space spade special sponge spoon spring
-    square stage stamp star start statement station steam steel stem
-    step stick sticky stiff still stitch stocking stomach stone stop
-    store story straight strange street stretch strong structure
-    substance such sudden sugar suggestion summer sun support surprise
-    sweet swim system table tail take talk tall taste tax teaching
-    tendency test than that the then theory there thick thin thing
-    this though thought thread throat through thumb thunder ticket
-    tight till time tin tired to toe together tomorrow tongue tooth
-    top touch town trade train transport tray tree trick trouble
-    trousers true turn twist umbrella under unit up use value verse
-    very vessel view violent voice waiting walk wall war warm wash
-    waste watch water wave wax way weather week weight well west wet
-    wheel when where while whip whistle white who why wide will wind
-    window wine wing winter wire wise with woman wood wool word work
-    worm wound writing wrong year yellow yes yesterday you young
-    """.split()
-
-    # from https://simple.wikipedia.org/wiki/Wikipedia:Basic_English_combined_wordlist
-    MoreBasicEnglish = """
-    April August December Dominion Embassy Empire February Friday
-    Geography Geology Geometry I Imperial January July June March May
-    Monday November October Physics Physiology President Prince
-    Princess Psychology Purr Royal Saturday September Sunday Thursday
-    Tuesday Wednesday a able about absence absorption acceleration
-    acceptance accessory accident account acid across act acting
-    active actor addition address adjacent adjustment adventure
-    advertisement advice after afterthought again against age agency
-    agent ago agreement air airplane alcohol algebra all allowance
-    almost along also alternative aluminium always ambition ammonia
-    among amount amplitude amusement anchor and anesthetic angle angry
-    animal ankle another answer ant any anybody anyhow anyone anything
-    anywhere apparatus appendage apple application approval
-    approximation arbitrary arbitration arc arch area argument
-    arithmetic arm army arrangement art as asbestos ash asset
-    assistant at attack attempt attention attraction authority autobus
-    automatic automobile average awake awkward axis baby back backbone
-    backwoods bad bag balance balcony bale ball ballet band bang bank
-    bankrupt bar bark barrel base based basin basing basket bath be
-    beak beaker beard beat beautiful because become bed bedroom bee
-    beef beer beeswax before behavior behind belief bell belt bent
-    berry bet between bill biology bird birefringence birth birthday
-    birthright bit bite bitter black blackberry blackbird blackboard
-    blade blame blanket blood bloodvessel blow blue bluebell board
-    boat body boiling bomb bone book bookkeeper boot both bottle
-    bottom box boy brain brake branch brass brave bread break
-    breakfast breast breath brick bridge bright broken broker brother
-    brown brush brushwood bubble bucket bud budget builder building
-    bulb bunch buoyancy burial burn burned burner burning burst
-    business busy but butter buttercup button by cafe cake calculation
-    calendar call camera canvas capacity capital card cardboard care
-    carefree caretaker carpet carriage cart carter cartilage case cast
-    cat catarrh cause cave cavity cell centi ceremony certain
-    certificate chain chair chalk champagne chance change character
-    charge chauffeur cheap check cheese chemical chemist chemistry
-    chest chief child chimney chin china chocolate choice chorus
-    church cigarette circle circuit circulation circumference circus
-    citron civilization claim claw clay clean clear cleavage clever
-    client climber clip clock clockwork cloth clothier clothing cloud
-    club coal coat cocktail code coffee cognac coil cold collar
-    collection college collision colony color column comb combination
-    combine come comfort committee common commonsense communications
-    company comparison competition complaint complete complex
-    component compound concept concrete condition conductor congruent
-    connection conscious conservation consignment constant consumer
-    continuous contour control convenient conversion cook cooked
-    cooker cooking cool copper copy copyright cord cork corner
-    correlation corrosion cost cotton cough country court cover cow
-    crack credit creeper crime crop cross cruel crush cry crying
-    cunning cup cupboard current curtain curve cushion cusp customs
-    cut damage damping dance dancer dancing danger dark date daughter
-    day daylight dead dear death debit debt deci decision deck
-    decrease deep defect deficiency deflation degenerate degree
-    delicate delivery demand denominator density department dependent
-    deposit desert design designer desire destruction detail
-    determining development dew diameter difference different
-    difficulty digestion dike dilution dinner dip direct direction
-    dirty disappearance discharge discount discovery discussion
-    disease disgrace disgust dislike dissipation distance distribution
-    disturbance ditch dive division divisor divorce do dog doll
-    domesticating door doubt down downfall drain drawer dreadful dream
-    dress dressing drift drink driver driving drop dropped dropper dry
-    duct dull dust duster duty dynamite each ear early earring earth
-    earthwork east easy economy edge education effect efficiency
-    effort egg eight either elastic electric electricity eleven
-    elimination employer empty encyclopedia end enemy engine engineer
-    enough envelope environment envy equal equation erosion error
-    eruption evaporation even evening event ever evergreen every
-    everybody everyday everyone everything everywhere exact example
-    exchange excitement exercise existence expansion experience
-    experiment expert explanation explosion export expression
-    extinction eye eyeball eyebrow eyelash face fact factor failure
-    fair fall false family famous fan far farm farmer fastening fat
-    father fatherland fault fear feather feeble feeling female ferment
-    fertile fertilizing fever fiber fiction field fifteen fifth fifty
-    fight figure fin financial finger fingerprint fire firearm fired
-    firefly fireman fireplace firework firing first fish fisher
-    fisherman five fixed flag flame flash flask flat flesh flight
-    flint flood floor flour flow flower fly focus fold folder
-    foliation food foolish foot football footlights footman footnote
-    footprint footstep for force forecast forehead foreign forgiveness
-    fork form forty forward four fourteen fourth fowl fraction
-    fracture frame free frequent fresh friction friend from front
-    frost frozen fruit full fume funnel funny fur furnace furniture
-    fusion future garden gardener gas gasworks gate general generation
-    germ germinating get gill girl give glacier gland glass glove
-    glycerin go goat god gold goldfish good goodlooking goodnight
-    government grain gram grand grass grateful grating gravel gray
-    grease great green grey grief grip grocery groove gross ground
-    group growth guarantee guard guess guide gum gun gunboat gunmetal
-    gunpowder habit hair half hammer hand handbook handkerchief handle
-    handwriting hanger hanging happy harbor hard harmony hat hate have
-    he head headdress headland headstone headway healthy hearing heart
-    heat heated heater heating heavy hedge help here hereafter
-    herewith high highlands highway hill himself hinge hire hiss
-    history hold hole holiday hollow home honest honey hoof hook hope
-    horn horse horseplay horsepower hospital host hotel hour hourglass
-    house houseboat housekeeper how however human humor hundred hunt
-    hurry hurt husband hyena hygiene hysteria ice idea if igneous ill
-    image imagination import important impulse impurity in inasmuch
-    inclusion income increase index individual indoors industry
-    inferno infinity inflation influenza inheritance ink inland inlet
-    inner innocent input insect inside instep institution instrument
-    insulator insurance integer intelligent intercept interest
-    international interpretation intersection into intrusion invention
-    inverse investigation investment invitation iron island itself jam
-    jaw jazz jealous jelly jerk jewel jeweler join joiner joint
-    journey judge jug juice jump jury justice keep keeper kennel
-    kettle key kick kidney kilo kind king kiss kitchen knee knife
-    knock knot knowledge lace lag lake lame lamp land landmark
-    landslip language large last late latitude laugh laughing lava law
-    lawyer layer lazy lead leaf learner learning least leather lecture
-    left leg legal length lens less lesson let letter level lever
-    liability library license lid life lift light lighthouse like lime
-    limestone limit line linen link lip liqueur liquid list liter
-    little liver living load loan local lock locker locking locus long
-    longitude look loose loss loud love low luck lump lunch lung
-    macaroni machine madam magic magnetic magnitude make malaria male
-    man manager manhole mania manner many map marble margin mark
-    marked market marriage married mass mast match material
-    mathematics mattress mature may meal mean meaning measure meat
-    medical medicine medium meeting melt member memory meow mess
-    message metabolism metal meter micro microscope middle military
-    milk mill milli million mind mine miner mineral minute mist mixed
-    mixture model modern modest momentum money monkey monopoly month
-    mood moon moral more morning most mother motion mountain moustache
-    mouth move much mud multiple multiplication murder muscle museum
-    music myself nail name narrow nasty nation natural nature navy
-    near nearer neat necessary neck need needle neglect neighbor nerve
-    nest net network neutron new news newspaper next nice nickel
-    nicotine night nine no nobody node noise normal north nose nostril
-    not note noted nothing now nowhere nucleus number numerator nurse
-    nut obedient observation of off offer office officer offspring oil
-    old olive omelet on once oncoming one oneself onlooker only onto
-    open opera operation opinion opium opposite or orange orchestra
-    order ore organ organism organization origin ornament other out
-    outburst outcome outcrop outcry outdoor outer outgoing outhouse
-    outlaw outlet outlier outline outlook output outside outskirts
-    outstretched oval oven over overacting overall overbalancing
-    overbearing overcoat overcome overdo overdressed overfull
-    overhanging overhead overland overlap overleaf overloud overseas
-    overseer overshoe overstatement overtake overtaxed overtime
-    overturned overuse overvalued overweight overworking own owner
-    oxidation packing pad page pain paint painter painting pair
-    pajamas pan paper paradise paraffin paragraph parallel parcel
-    parent park part particle parting partner party passage passport
-    past paste patent path patience payment peace pedal pen pencil
-    pendulum penguin pension people perfect person petal petroleum
-    phonograph physical piano picture pig pin pincushion pipe piston
-    place plain plan plane plant plaster plate platinum play played
-    playing plaything please pleased pleasure plough plow plug pocket
-    poetry point pointer pointing poison police policeman polish
-    political pollen pool poor population porcelain porter position
-    possible post postman postmark postmaster postoffice pot potash
-    potato potter powder power practice praise prayer present pressure
-    price prick priest prime print printer prison prisoner private
-    probability probable process produce producer product profit
-    program progress projectile projection promise proof propaganda
-    property prose protest proud public pull pulley pump punishment
-    pupil purchase pure purpose push put pyramid quack quality
-    quantity quarter queen question quick quiet quinine quite quotient
-    race radiation radio radium rail rain raining range rat rate ratio
-    ray reaction reader reading ready reagent real reason receipt
-    receiver reciprocal record rectangle recurring red reference
-    referendum reflux regret regular reinforcement relation relative
-    religion remark remedy rent repair representative reproduction
-    repulsion request residue resistance resolution respect
-    responsible rest restaurant result retail revenge reversible
-    reward rheumatism rhythm rice rich right rigidity ring rise rival
-    river road rock rod roll roller roof room root rot rotation rough
-    round rub rubber rude rule ruler rum run runaway rust sac sad safe
-    sail sailor salad sale salt same sample sand sardine satisfaction
-    saturated saucer saving say scale scarp schist school science
-    scissors scratch screen screw sea seal seaman search seat second
-    secondhand secret secretary secretion section security sedimentary
-    see seed seem selection self selfish send sense sensitivity
-    sentence sepal separate serious serum servant service set seven
-    sex shade shadow shake shale shame share sharp shave shear sheep
-    sheet shelf shell ship shirt shock shocked shocking shoe shore
-    short shorthand shoulder show shut side sideboard sidewalk sight
-    sign silk sill silver similarity simple since sir sister six
-    sixteen size skin skirt skull sky slate sleep sleeve slide slip
-    slope slow small smash smell smile smoke smooth snake sneeze snow
-    snowing so soap social society sock soft soil soldier solid
-    solution solvent some somebody someday somehow someone something
-    sometime somewhat somewhere son song sorry sort sound soup south
-    space spade spark special specialization specimen speculation
-    spirit spit splash sponge spoon sport spot spring square stable
-    stage stain stair stalk stamen stamp star start statement station
-    statistics steady steam steamer steel stem step stick sticky stiff
-    still stimulus stitch stocking stomach stone stop stopper stopping
-    store storm story straight strain strange straw stream street
-    strength stress stretch stretcher strike string strong structure
-    study subject substance substitution subtraction success
-    successive such suchlike sucker sudden sugar suggestion sum summer
-    sun sunburn sunlight sunshade supply support surface surgeon
-    surprise suspension suspicious sweet sweetheart swelling swim
-    swing switch sympathetic system table tail tailor take talk
-    talking tall tame tap tapioca taste tax taxi tea teacher teaching
-    tear telegram telephone ten tendency tent term terrace test
-    texture than that the theater then theory there thermometer thick
-    thickness thief thimble thin thing third thirteen thirty this
-    thorax though thought thousand thread threat three throat through
-    thrust thumb thunder ticket tide tie tight till time tin tired
-    tissue to toast tobacco today toe together tomorrow tongs tongue
-    tonight too tooth top torpedo total touch touching towel tower
-    town trade trader tradesman traffic tragedy train trainer training
-    transmission transparent transport trap travel tray treatment tree
-    triangle trick trouble troubled troubling trousers truck true tube
-    tune tunnel turbine turn turning twelve twenty twice twin twist
-    two typist ugly umbrella unconformity under underclothing
-    undercooked undergo undergrowth undermined undersigned undersized
-    understanding understatement undertake undervalued undo unit
-    universe university unknown up upkeep uplift upon upright uptake
-    use used valency valley value valve vanilla vapor variable
-    vascular vegetable velocity verse very vessel vestigial victim
-    victory view viewpoint violent violin visa vitamin vodka voice
-    volt volume vortex vote waiter waiting walk wall war warm wash
-    waste wasted watch water waterfall wave wax way weak weather wedge
-    week weekend weight welcome well west wet what whatever wheel when
-    whenever where whereas whereby wherever whether which whichever
-    while whip whisky whistle white whitewash who whoever wholesale
-    why wide widow wife wild will wind window windpipe wine wing
-    winter wire wise with within without woman wood woodwork wool word
-    work worker workhouse working world worm wound wreck wrist writer
-    writing wrong yawn year yearbook yellow yes yesterday you young
-    yourself zebra zinc zookeeper zoology""".split()
-
-    Kana = """
-    a  i  u  e  o  ka ki ku ke ko sa shi su se so ta chi tsu te to
-    na ni nu ne no ha hi fu he ho ma mi  mu me mo ya yu  yo
-    ra ri ru re ro wa wo n
-    """.split()
+    _annotate = staticmethod(_annotate)
 
+class Wordlist:
+    # Preset word lists, shipped as packed corpora (pre-sorted, see
+    # corpus_source/) and loaded by corpus_loader when first used.
     preset_corpus = {
-        "english": MoreBasicEnglish,
-        "basicenglish": BasicEnglish,
-        "kana": Kana,
-        "icaowords": Charlist.IcaoWordsLower,
-        "ICAOwords": Charlist.IcaoWordsUpper,
+        "english": "more_basic_english",
+        "basicenglish": "basic_english",
+        "kana": "kana",
+        "icaowords": "icao_words",
+        "ICAOwords": "icao_words_upper",
     }
 
 class UUIDver4(WordsCorpusBase):
@@ -1129,39 +1031,136 @@ class UUIDver4(WordsCorpusBase):
             self.variant = variant
             self.bits = 123 - variant
         self.n = 1 << self.bits
+        # An index is mapped to the UUID by filling all non-fixed bits
+        # in order, from the least significant one.
+        self.b2bits = 15 - variant
+        self.b2mask = (1 << self.b2bits) - 1
 
     def len(self):
         return self.n
 
     def get_with_hint(self, x):
         assert 0 <= x < self.n
-
-        budget = self.bits
-        b = x
-        def takebits(bits):
-            nonlocal budget
-            nonlocal b
-            assert budget >= bits
-            budget -= bits
-            r = b & ((1 << bits) - 1)
-            b >>= bits
-            return r
-
-        b2bits = 15 - self.variant
-        b1 = takebits(48)
-        b2 = takebits(b2bits)
-        b3 = takebits(12)
-        b4 = takebits(16)
-        b5 = takebits(32)
-        assert budget == 0
-
-        s = "%08x-%04x-%04x-%04x-%012x" % (b5, b4, b3 | 0x4000, b2 | ((self. variant + 1) << 14), b1)
+        return self._from_int(self.to_uuid_int(x))
+
+    def to_uuid_int(self, x):
+        """Convert an index to the 128-bit integer value of the UUID."""
+        b2bits = self.b2bits
+        return ((x >> (60 + b2bits) << 80) |
+                (0x4 << 76) |
+                ((x >> (48 + b2bits) & 0xfff) << 64) |
+                (((self.variant + 1) << 14 | (x >> 48 & self.b2mask)) << 48) |
+                (x & 0xffffffffffff))
+
+    def from_uuid_int(self, u):
+        """Convert a 128-bit integer value of UUID to an index."""
+        b2bits = self.b2bits
+        return (((u >> 80) << (60 + b2bits)) |
+                ((u >> 64 & 0xfff) << (48 + b2bits)) |
+                ((u >> 48 & self.b2mask) << 48) |
+                (u & 0xffffffffffff))
+
+    @staticmethod
+    def _from_int(u):
+        h = "%032x" % u
+        s = "%s-%s-%s-%s-%s" % (h[0:8], h[8:12], h[12:16], h[16:20], h[20:32])
         return WordTuple(s, s)
 
+    def get_randomly_bulk(self, count, rng=None):
+        # Fill random octets in bulk, and overwrite version and
+        # variant bits by translating all relevant octets at once.
+        # The result is equivalent to that of get_with_hint() on
+        # uniformly-chosen indexes.
+        if count < 1:
+            return []
+        buf = bytearray((rng or R).getrandbits(count * 128).to_bytes(count * 16, 'big'))
+        vmask = 0xff >> (self.variant + 1)
+        vbits = (self.variant + 1) << 6
+        buf[6::16] = buf[6::16].translate(_UUID_VERSION_TABLE)
+        buf[8::16] = buf[8::16].translate(bytes((c & vmask) | vbits for c in range(256)))
+        h = buf.hex()
+        o = []
+        for p in range(0, count * 32, 32):
+            s = "%s-%s-%s-%s-%s" % (h[p:p+8], h[p+8:p+12], h[p+12:p+16], h[p+16:p+20], h[p+20:p+32])
+            o.append(WordTuple(s, s))
+        return o
+
+_UUID_VERSION_TABLE = bytes((c & 0x0f) | 0x40 for c in range(256))
+
+class ArithmeticCorpus(WordsCorpusBase):
+    """Corpus of fixed-width codes computed from indexes, without word lists.
+
+    Words are representations of indexes 0 to n-1 in base len(alphabet),
+    zero-padded to <width> digits.  The alphabet must be sorted."""
+
+    def __init__(self, name, alphabet, width, n=None, fmt=None):
+        self.name = name
+        self.alphabet = alphabet
+        self.radix = len(alphabet)
+        self.width = width
+        self.n = self.radix ** width if n == None else n
+        self.fmt = fmt
+        assert self.n <= self.radix ** width
+
+    def len(self):
+        return self.n
+
+    def get_word(self, x):
+        if x < 0 or x >= self.n or int(x) != x:
+            raise IndexError(x)
+        if self.fmt:
+            return self.fmt % (self.width, x)
+        a, r = self.alphabet, self.radix
+        o = []
+        for _ in range(self.width):
+            x, d = divmod(x, r)
+            o.append(a[d])
+        return "".join(reversed(o))
+
+    def get_with_hint(self, x):
+        w = self.get_word(x)
+        return WordTuple(w, w)
+
 class BuiltinCorpus:
     builtins = {
         "uuid": UUIDver4()
     }
 
+    MAXWIDTH = 1024
+
+    # name pattern: (alphabet, format, whether the number is bits)
+    arithmetic = [
+        (r'pin(\d+)',       Charlist.Digits,           '%0*d', False),
+        (r'hex(\d+)',       Charlist.Hexadecimal,      '%0*x', True),
+        (r'HEX(\d+)',       Charlist.UpperHexadecimal, '%0*X', True),
+        (r'base32-(\d+)',   "".join(sorted(Charlist.Base32)),      None, False),
+        (r'BASE32-(\d+)',   "".join(sorted(Charlist.Base32Upper)), None, False),
+        (r'crockford(\d+)', Charlist.Crockford,        None, False),
+    ]
+
+    @classmethod
+    def is_arithmetic(self, target):
+        return any(re.fullmatch(e[0], target) for e in self.arithmetic)
+
+    @classmethod
+    def get_arithmetic(self, target):
+        """Get an arithmetic corpus of fixed-width codes by its name.
+
+        Returns None if target is not a name of such corpora."""
+        for pat, alphabet, fmt, is_bits in self.arithmetic:
+            mo = re.fullmatch(pat, target)
+            if not mo:
+                continue
+            w = int(mo.group(1))
+            if is_bits:
+                n = 1 << w
+                w = (w + 3) // 4
+            else:
+                n = None
+            if w > self.MAXWIDTH:
+                raise BadFormatError("too wide code requested: {}".format(target))
+            return ArithmeticCorpus(target, alphabet, w, n=n, fmt=fmt)
+        return None
+
 if __name__ == '__main__':
     main()
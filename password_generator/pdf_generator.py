@@ -10,7 +10,11 @@ import sys
 import os
 import re
 import json
-import subprocess
+import functools
+import itertools
+import contextlib
+import io
+import time
 
 if __name__ == '__main__':
     import password_generator
@@ -20,21 +24,28 @@ else:
 VERSION = password_generator.VERSION + ""
 FULL_VERSION = os.path.basename(sys.argv[0]) + " " + VERSION
 
-from reportlab.pdfgen import canvas
-from reportlab.lib import pdfencrypt
+# Other parts of ReportLab, and qrcode, are imported when first used.
 from reportlab.lib.pagesizes import A4, letter, portrait
-from reportlab.lib.utils import ImageReader
 from reportlab.lib.units import cm, mm, inch
-from reportlab.pdfbase import pdfmetrics
-#from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-from reportlab.pdfbase.pdfmetrics import stringWidth
 
 from collections import namedtuple
 from types import SimpleNamespace
 pt = inch / 72.0
 
-pdfmetrics.registerFont(UnicodeCIDFont('HeiseiKakuGo-W5'))
+# text widths are rounded up to this unit (in points) for the layout cache.
+LAYOUT_QUANTUM = 0.25
+LAYOUT_CACHE = 1024
+# number of full strings kept in the font metrics cache.
+FONT_CACHE = 4096
+# default number of pages in a file written by parallel batch rendering.
+BATCH_PAGES = 50
+# number of separate files rendered by one task of a worker process.
+SPLIT_CHUNK = 16
+# read size of streamed JSON input.
+JSON_BUFSIZE = 65536
+
+# fonts registered when first measured.
+CIDFonts = ('HeiseiKakuGo-W5',)
 #pdfmetrics.registerFont(TTFont(Font, FontFNAME))
 #FontFNAME = '/usr/share/fonts/opentype/noto/NotoSansCJK-Medium.ttc'
 #Font = 'NotoSansCJK-Medium'
@@ -51,6 +62,7 @@ class BadDataError(ValueError):
 # utility routine
 
 def prepare_canvas(c_or_fname, size, pdfargs={}):
+    from reportlab.pdfgen import canvas
     if isinstance(c_or_fname, canvas.Canvas):
         return c_or_fname
     else:
@@ -59,20 +71,43 @@ def prepare_canvas(c_or_fname, size, pdfargs={}):
 
 # text management routines
 
-__fsize_cache = {}
-def font_and_width(s, fonts, size):
-    t = (s, fonts, size)
-    if t in __fsize_cache:
-        return __fsize_cache[t]
+# advance widths of single characters at size 1, per font.
+_glyph_widths = {}
+
+def _load_font(font):
+    if font in CIDFonts:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        pdfmetrics.registerFont(UnicodeCIDFont(font))
+
+def string_width(s, font, size):
+    widths = _glyph_widths.get(font)
+    if widths == None:
+        _load_font(font)
+        widths = _glyph_widths[font] = {}
+    try:
+        return sum(map(widths.__getitem__, s)) * size
+    except KeyError:
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+        for ch in s:
+            if ch not in widths:
+                widths[ch] = stringWidth(ch, font, 1.0)
+        return sum(map(widths.__getitem__, s)) * size
+
+@functools.lru_cache(maxsize=FONT_CACHE)
+def _font_and_width1(s, fonts):
+    # font and width at size 1
     if type(fonts) is str:
         font = fonts
     elif re.match(r'\A[ -\u00FF]*\Z', s):
         font = fonts[-1]
     else:
         font = fonts[0]
-    r = (font, stringWidth(s, font, size))
-    __fsize_cache[t] = r
-    return r
+    return (font, string_width(s, font, 1.0))
+
+def font_and_width(s, fonts, size):
+    font, w = _font_and_width1(s, fonts)
+    return (font, w * size)
 
 def draw_text_fitted(c, x, y, width, height, fonts, maxsize, text, *, maxshrink=1.0, centered=False):
     c.setStrokeColorRGB(0.9, 0.9, 0.9)
@@ -141,6 +176,49 @@ def layout_lines_y(lines, boxheight, lineheight, linespacing, align='top', start
     #print(" => content_height={}, lineheight={}, topmargin={}, lineskip={}, y={!r}".format(content_height, lineheight_r, topmargin, lineskip, lines_y))
     return (content_height, lineheight_r, lines_y)
 
+# QR code routines
+
+# quiet zone around QR codes, in modules.
+QR_BORDER = 4
+
+@functools.lru_cache(maxsize=None)
+def _qr_encoder(error_correction):
+    import qrcode
+    return qrcode.QRCode(error_correction=error_correction, border=QR_BORDER)
+
+def qr_modules(data, error_correction=0):
+    """
+    Encode data into a QR code; returns the module matrix
+    without the quiet zone, as a tuple of rows of booleans.
+    error_correction is a constant of qrcode (ERROR_CORRECT_M by default).
+    """
+    qr = _qr_encoder(error_correction)
+    qr.clear()
+    qr.version = None
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(tuple(bool(m) for m in row) for row in qr.modules)
+
+def draw_qr(c, modules, x, y, size):
+    """
+    Draw a QR module matrix as filled rectangles, with a quiet zone,
+    into a size x size square at (x, y).
+    """
+    n = len(modules)
+    unit = size / (n + QR_BORDER * 2)
+    x0 = x + QR_BORDER * unit
+    y0 = y + size - QR_BORDER * unit
+    p = c.beginPath()
+    for r, row in enumerate(modules):
+        start = None
+        for col, m in enumerate(row + (False,)):
+            if m and start == None:
+                start = col
+            elif not m and start != None:
+                p.rect(x0 + start * unit, y0 - (r + 1) * unit, (col - start) * unit, unit)
+                start = None
+    c.drawPath(p, stroke=0, fill=1)
+
 # Layout
 
 class CardLayout(namedtuple('CardLayout', '''
@@ -154,7 +232,37 @@ class CardLayout(namedtuple('CardLayout', '''
 
   __slots__ = ()
 
+  # number of cards on a page
+  cards = 1
+
   def _compute_layout(self, dat, qr, title, hint, pwdelems):
+    """
+    Compute the positions of the card contents for dat.
+
+    Only the number of lines and the widest elements and hints
+    matter; the result is shared between cards and must not be
+    modified.
+    """
+    qr, title = bool(qr), bool(title)
+    if not (hint or pwdelems):
+        return self._compute_geometry(0, 0.0, 0.0, qr, title, hint, pwdelems)
+
+    lines = len(dat[0])
+    pwdsize, hintsize = self._text_sizes(lines, title)
+    pw = hw = 0.0
+    for n in range(lines):
+        pw = max(pw, font_and_width(dat[0][n], PwdFont, pwdsize)[1])
+        hw = max(hw, font_and_width(dat[1][n], HintFont, hintsize)[1])
+    pw = math.ceil(pw / LAYOUT_QUANTUM) * LAYOUT_QUANTUM
+    hw = math.ceil(hw / LAYOUT_QUANTUM) * LAYOUT_QUANTUM
+    return self._compute_geometry(lines, pw, hw, qr, title, hint, pwdelems)
+
+  def _text_sizes(self, lines, title):
+    # font sizes of password elements and hints for the given lines.
+    return self._compute_geometry(lines, 0.0, 0.0, False, title, True, True).pwdsize_hintsize
+
+  @functools.lru_cache(maxsize=LAYOUT_CACHE)
+  def _compute_geometry(self, lines, pw, hw, qr, title, hint, pwdelems):
       #class ComputedLayout(namedtuple('ComputedLayout', '''
       #                titlebase titleheight titleleft titlewidth
       #                pwdbase pwdheight pwdleft pwdwidth
@@ -204,7 +312,7 @@ class CardLayout(namedtuple('CardLayout', '''
     r.lowboxwidth = allowed_width
 
     if hint or pwdelems:
-        lines = r.lines = len(dat[0])
+        r.lines = lines
 
         c1, s1, y1 = layout_lines_y(lines,
                                     allowed_height,
@@ -216,11 +324,7 @@ class CardLayout(namedtuple('CardLayout', '''
         r.linesheight = s1
         r.pwdsize = min(s1, self.pwdsize)
         r.hintsize = min(s1, self.hintsize)
-        pw = hw = 0.0
-
-        for n in range(r.lines):
-            pw = max(pw, font_and_width(dat[0][n], PwdFont, r.pwdsize)[1])
-            hw = max(hw, font_and_width(dat[1][n], HintFont, r.hintsize)[1])
+        r.pwdsize_hintsize = (r.pwdsize, r.hintsize)
         #print("pw={}, hw={}".format(pw, hw))
         if hint and pwdelems:
             minwidth = pw + hw + self.hintsep
@@ -328,14 +432,19 @@ class CardLayout(namedtuple('CardLayout', '''
                              maxshrink = 0.85)
 
     if qr:
-        c.drawImage(qr,
-                    x + l2.qrleft, y + l2.qrbottom,
-                    width = self.qrsize, height = self.qrsize)
+        draw_qr(c, qr, x + l2.qrleft, y + l2.qrbottom, self.qrsize)
         if DEBUGBOX:
             c.rect(x + l2.qrleft, y + l2.qrbottom,
                    width = self.qrsize, height = self.qrsize)
     return c
 
+  def draw_cards(self, c, cards, x = 0.0, y = 0.0, **kwargs):
+    """
+    Draw a page of cards; cards is a sequence of (dat, qr) pairs.
+    """
+    (dat, qr), = cards
+    return self.draw(c, dat, x = x, y = y, qr = qr, **kwargs)
+
 class MultiCardLayout(namedtuple('MultiCardLayout', '''
                 description width height
                 layout xcount ycount
@@ -343,7 +452,22 @@ class MultiCardLayout(namedtuple('MultiCardLayout', '''
                 topmargin yseparate''')):
     __slots__ = ()
 
-    def draw(self, c, dat, x = 0.0, y = 0.0, pdfargs={}, **kwargs):
+    @property
+    def cards(self):
+        return self.xcount * self.ycount
+
+    def draw(self, c, dat, x = 0.0, y = 0.0, pdfargs={}, qr=None, **kwargs):
+        """
+        Draw the same passphrase on all cards.
+        """
+        return self.draw_cards(c, [(dat, qr)] * self.cards, x = x, y = y, pdfargs = pdfargs, **kwargs)
+
+    def draw_cards(self, c, cards, x = 0.0, y = 0.0, pdfargs={}, **kwargs):
+        """
+        Draw a page of cards; cards is a sequence of (dat, qr) pairs,
+        placed from the top-left card in rows.  Cards beyond the end
+        of the sequence are left blank.
+        """
         c = prepare_canvas(c, (self.width, self.height), pdfargs)
 
         cw, ch = self.layout.width, self.layout.height
@@ -365,16 +489,16 @@ class MultiCardLayout(namedtuple('MultiCardLayout', '''
                             - (self.ycount - 1) * self.yseparate
                             - self.topmargin)
 
-        c = prepare_canvas(c, (self.width, self.height), pdfargs)
-
         ww = cw + self.xseparate
         hh = ch + self.yseparate
-        for xx in range(self.xcount):
-            for yy in range(self.ycount):
-                self.layout.draw(c, dat,
-                                 x = x + leftmargin + ww * xx,
-                                 y = y + bottommargin + hh * yy,
-                                 **kwargs)
+        positions = [(xx, yy) for yy in reversed(range(self.ycount))
+                     for xx in range(self.xcount)]
+        for (xx, yy), (dat, qr) in zip(positions, cards):
+            self.layout.draw(c, dat,
+                             x = x + leftmargin + ww * xx,
+                             y = y + bottommargin + hh * yy,
+                             qr = qr,
+                             **kwargs)
 
         return c
 
@@ -448,16 +572,154 @@ def verify_json_data(json_dat):
                 type(dic.get('password')) is not str or
                 type(dic.get('hint')) is not str):
                 raise BadDataError
-    except LookupError:
+    except (LookupError, AttributeError, TypeError):
         raise BadDataError
 
-def generate_pdf(output, json_dat, qrcode=False,
-                 wifi_ssid=None,
-                 encrypt=False,
-                 layout='1',
-                 pwdelems=True,
-                 hint=True,
-                 title=None):
+class _JSONReader:
+    # incremental reader of a text stream of JSON values.
+
+    _ws = re.compile(r'\s*')
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, f, bufsize=JSON_BUFSIZE):
+        self.f = f
+        self.bufsize = bufsize
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _more(self):
+        if self.eof:
+            return False
+        # read at least as much as buffered, so that a long value is
+        # decoded a logarithmic number of times.
+        d = self.f.read(max(self.bufsize, len(self.buf) - self.pos))
+        if d == "":
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + d
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # next non-space character, or "" at the end.
+        while True:
+            self.pos = self._ws.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
+
+    def expect(self, chars):
+        c = self.peek()
+        if c == "" or c not in chars:
+            raise BadDataError("one of {!r} expected".format(chars))
+        self.pos += 1
+        return c
+
+    # plain text, complete strings and innermost arrays and objects.
+    # A string or container continuing past the window is left at its
+    # opening character; the window bounds the backtracking stack.
+    _skip_plain = re.compile(r"""(?:[^"\[\]{}]+ | "[^"\\]*(?:\\.[^"\\]*)*" |
+                                    \[[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*\] |
+                                    \{[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*\})*""", re.X)
+    _skip_string = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*')
+    _skip_window = 2048
+    _closing = {'[': ']', '{': '}'}
+
+    def skip(self):
+        # skips a value without decoding it.  Arrays, objects and
+        # strings are scanned through the buffer, so that they need
+        # not fit in memory.
+        c = self.peek()
+        if c not in ('[', '{', '"'):
+            self.value()
+            return
+        opened = []
+        in_string = False
+        while True:
+            if self.pos >= len(self.buf) and not self._more():
+                raise BadDataError("unterminated JSON value")
+            if in_string:
+                self.pos = self._skip_string.match(self.buf, self.pos).end()
+                if self.pos < len(self.buf) and self.buf[self.pos] == '"':
+                    self.pos += 1
+                    in_string = False
+                    if not opened:
+                        return
+                elif not self._more():
+                    # at the end, or a backslash split by a read
+                    raise BadDataError("unterminated JSON string")
+                continue
+            if opened:
+                end = min(len(self.buf), self.pos + self._skip_window)
+                self.pos = self._skip_plain.match(self.buf, self.pos, end).end()
+                if self.pos == end:
+                    continue
+            c = self.buf[self.pos]
+            self.pos += 1
+            if c == '"':
+                in_string = True
+            elif c in self._closing:
+                opened.append(self._closing[c])
+            elif not opened or opened.pop() != c:
+                raise BadDataError("unmatched {!r} in JSON value".format(c))
+            elif not opened:
+                return
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                v, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._more():
+                    continue
+                raise BadDataError(str(e))
+            # a number may continue in the next read.
+            if end == len(self.buf) and self._more():
+                continue
+            self.pos = end
+            return v
+
+def iter_json_passphrases(f):
+    """Read passphrases from a JSON text stream incrementally.
+
+    The stream may contain a single passphrase (an array of elements),
+    an object with an "elements" array as output by make-password
+    --json, or a sequence of these (e.g. NDJSON).  Yields element lists;
+    an "elements" array is read one passphrase at a time, and other
+    values are skipped without being decoded."""
+
+    r = _JSONReader(f)
+    while r.peek() != "":
+        if r.peek() != "{":
+            yield r.value()
+            continue
+        r.expect("{")
+        if r.peek() == "}":
+            r.expect("}")
+            continue
+        while True:
+            key = r.value()
+            r.expect(":")
+            if key == 'elements' and r.peek() == "[":
+                r.expect("[")
+                if r.peek() == "]":
+                    r.expect("]")
+                else:
+                    while True:
+                        yield r.value()
+                        if r.expect(",]") == "]":
+                            break
+            else:
+                # e.g. the "passwords" array of make-password --json
+                r.skip()
+            if r.expect(",}") == "}":
+                break
+
+def _card_data(json_dat):
+    # returns ((elements, hints), password)
     w = []
     h = []
 
@@ -476,28 +738,39 @@ def generate_pdf(output, json_dat, qrcode=False,
     except LookupError:
         raise BadDataError
 
-    password = "".join(w)
+    return (w, h), "".join(w)
 
-    dat = (w, h)
+def _qr_data(password, wifi_ssid=None):
+    if wifi_ssid:
+        qr_dat = 'WIFI:T:WPA;S:"{}";P:"{}";;'.format(wifi_quote(wifi_ssid), wifi_quote(password))
+    else:
+        qr_dat = password
+    return qr_modules(qr_dat)
+
+def _set_metadata(c, title):
+    c.setCreator(FULL_VERSION)
+    c.setAuthor('')
+    c.setSubject('')
+    c.setTitle(title or '')
+
+def generate_pdf(output, json_dat, qrcode=False,
+                 wifi_ssid=None,
+                 encrypt=False,
+                 layout='1',
+                 pwdelems=True,
+                 hint=True,
+                 title=None):
+    dat, password = _card_data(json_dat)
 
     if wifi_ssid:
         qrcode = True
         if title == None:
             title = wifi_ssid
 
-    if qrcode:
-        import qrcode
-        if wifi_ssid:
-            qr_dat = 'WIFI:T:WPA;S:"{}";P:"{}";;'.format(wifi_quote(wifi_ssid), wifi_quote(password))
-        else:
-            qr_dat = password
-        qr = qrcode.make(qr_dat)
-        qr = qr.get_image()
-        qr = ImageReader(qr)
-    else:
-        qr = None
+    qr = _qr_data(password, wifi_ssid) if qrcode else None
 
     if encrypt:
+        from reportlab.lib import pdfencrypt
         enc = pdfencrypt.StandardEncryption(password + "--usr", password, strength=128)
     else:
         enc = None
@@ -506,24 +779,159 @@ def generate_pdf(output, json_dat, qrcode=False,
 
     c = layout.draw(output, dat, hint=hint, pwdelems=pwdelems,
                     qr=qr, title=title, pdfargs={'encrypt': enc})
-    c.setCreator(FULL_VERSION)
-    c.setAuthor('')
-    c.setSubject('')
-    c.setTitle(title or '')
+    _set_metadata(c, title)
     c.showPage()
     c.save()
 
+def generate_pdf_batch(output, json_dats, qrcode=False,
+                       wifi_ssid=None,
+                       layout='1',
+                       pwdelems=True,
+                       hint=True,
+                       title=None):
+    """Generate a multi-page PDF for many passphrases.
+
+    json_dats is an iterable of element lists, as in generate_pdf().
+    Each card of the layout gets its own passphrase; one canvas is
+    used for all pages.  Returns the number of passphrases."""
+
+    if wifi_ssid:
+        qrcode = True
+        if title == None:
+            title = wifi_ssid
+
+    layout = layouts[layout]
+    c = prepare_canvas(output, (layout.width, layout.height))
+    _set_metadata(c, title)
+
+    n = 0
+    cards = []
+    for json_dat in json_dats:
+        dat, password = _card_data(json_dat)
+        cards.append((dat, _qr_data(password, wifi_ssid) if qrcode else None))
+        n += 1
+        if len(cards) == layout.cards:
+            layout.draw_cards(c, cards, hint=hint, pwdelems=pwdelems, title=title)
+            c.showPage()
+            cards = []
+    if cards:
+        layout.draw_cards(c, cards, hint=hint, pwdelems=pwdelems, title=title)
+        c.showPage()
+    c.save()
+    return n
+
+def _pages(json_dats, layout):
+    return -(-len(json_dats) // layouts[layout].cards)
+
+def _chunks(it, n):
+    # lists of n items from iterable it
+    it = iter(it)
+    return iter(lambda: list(itertools.islice(it, n)), [])
+
+def _numbered(output_base, i, digits=1):
+    return "{}-{:0{}d}.pdf".format(output_base, i, digits)
+
+def _render_files(args):
+    # worker: render (filename, element lists) pairs; returns pages.
+    files, single, pdfopts = args
+    pages = 0
+    for fname, json_dats in files:
+        if single:
+            generate_pdf(fname, json_dats[0], **pdfopts)
+            pages += 1
+        else:
+            generate_pdf_batch(fname, json_dats, **pdfopts)
+            pages += _pages(json_dats, pdfopts.get('layout', '1'))
+    return pages
+
+def _completed(executor, tasks, window):
+    # results of tasks run by executor in completion order,
+    # with at most window tasks submitted at once.
+    import concurrent.futures
+    pending = set()
+    for a in tasks:
+        if len(pending) >= window:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for f in done:
+                yield f.result()
+        pending.add(executor.submit(_render_files, a))
+    for f in concurrent.futures.as_completed(pending):
+        yield f.result()
+
+def render_files(output_base, elements, jobs=1, split=False, pages_per_file=BATCH_PAGES, progress=False, **pdfopts):
+    """Render many passphrases into a series of PDF files.
+
+    The files are named output_base-1.pdf, output_base-2.pdf, ...,
+    numbered with a fixed number of digits.  With split, each file
+    holds a single passphrase as generate_pdf() does; otherwise each
+    holds pages_per_file pages of generate_pdf_batch() output.  Files
+    are rendered in jobs worker processes.  elements may be any
+    iterable, which is consumed as rendering proceeds.  Returns the
+    list of file names."""
+
+    layout = pdfopts.get('layout', '1')
+    groups = _chunks(elements, 1 if split else layouts[layout].cards * pages_per_file)
+
+    # files are numbered without padding until the count is known.
+    files = ((_numbered(output_base, i), g) for i, g in enumerate(groups, 1))
+    # tasks are sized so that workers report progress regularly.
+    tasks = ((f, split, pdfopts) for f in _chunks(files, SPLIT_CHUNK if split else 1))
+    nfiles = 0
+    def counted(tasks):
+        nonlocal nfiles
+        for a in tasks:
+            nfiles += len(a[0])
+            yield a
+
+    pages = 0
+    t = time.perf_counter()
+    if jobs == 1:
+        rendered = map(_render_files, counted(tasks))
+    else:
+        import concurrent.futures
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        rendered = _completed(executor, counted(tasks), jobs * 2)
+    for p in rendered:
+        pages += p
+        if progress:
+            print("\rrendered {} pages ({:.1f} pages/sec)".format(
+                pages, pages / (time.perf_counter() - t)), end="", file=sys.stderr)
+            sys.stderr.flush()
+    if jobs != 1:
+        executor.shutdown()
+    if progress:
+        print("", file=sys.stderr)
+
+    digits = len(str(nfiles))
+    names = [_numbered(output_base, i, digits) for i in range(1, nfiles + 1)]
+    for i, name in enumerate(names, 1):
+        if name != _numbered(output_base, i):
+            os.replace(_numbered(output_base, i), name)
+    return names
+
 # Other outputs and data formats
 
-def generate_textfile(fname, dat, encrypt_to):
+@contextlib.contextmanager
+def open_textfile(fname, encrypt_to):
+    """Open a text file for writing, optionally encrypted by gpg."""
     with open(fname, 'w', encoding='utf-8', errors='replace') as f:
         if encrypt_to:
-            subprocess.run(['gpg', '-ae', '-r', encrypt_to, '-'],
-                           input=dat.encode('utf-8', errors='replace'),
-                           stdout=f,
-                           check=True)
+            import subprocess
+            args = ['gpg', '-ae', '-r', encrypt_to, '-']
+            p = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=f)
+            w = io.TextIOWrapper(p.stdin, encoding='utf-8', errors='replace')
+            try:
+                yield w
+            finally:
+                w.close()
+                if p.wait() != 0:
+                    raise subprocess.CalledProcessError(p.returncode, args)
         else:
-            print(dat, end="", file=f)
+            yield f
+
+def generate_textfile(fname, dat, encrypt_to):
+    with open_textfile(fname, encrypt_to) as f:
+        print(dat, end="", file=f)
 
 def wifi_quote(s):
     return re.sub(r'([\\",;:])', r'\\\1', s)
@@ -557,6 +965,12 @@ def main():
     parser.add_argument('--title', help='put title line')
     parser.add_argument('--no-partial-passwords', action='store_false', dest='pwdelems', help=argparse.SUPPRESS)
     parser.add_argument('--json', action='store_true',help='reuse previous passphrase data in JSON format')
+    parser.add_argument('--batch', type=int, metavar='N', help='generate N passphrases into a multi-page sheet')
+    parser.add_argument('--range', metavar='FIRST-LAST', help='with --json, print the selected range of passphrases as --batch does')
+    parser.add_argument('--split', action='store_true', help='with --batch and -O, write each passphrase to a separate PDF')
+    parser.add_argument('--jobs', type=int, metavar='N', help='with --batch and -O, render PDF files in N processes')
+    parser.add_argument('--pages-per-file', type=int, metavar='N', default=BATCH_PAGES,
+                        help='with --jobs, number of pages in each PDF file (default: {})'.format(BATCH_PAGES))
     parser.add_argument('format', help='password format (or JSON filename with --json)')
     parser.add_argument('count', help='number of generated passwords', nargs='?', type=int, default=None)
     parser.add_argument('--debug', action='store_true', help=argparse.SUPPRESS)
@@ -568,6 +982,11 @@ def main():
     if opts.debug:
         DEBUGBOX = True
 
+    if opts.batch != None or opts.range != None:
+        return main_batch(parser, opts)
+    if opts.split or opts.jobs != None:
+        parser.error("--split and --jobs require --batch or --range")
+
     if opts.json:
         if opts.format == '-':
             json_dat = json.load(sys.stdin)
@@ -634,10 +1053,7 @@ def main():
     os.umask(os.umask(0o077) | 0o077)
 
     if opts.output_base:
-        base, sep, out = opts.output_base.rpartition('/')
-        if sep:
-            os.makedirs(base, mode=0o700, exist_ok=True)
-        output_base = opts.output_base if out != '' else opts.output_base + "password"
+        output_base = _output_base(opts.output_base)
         output = output_base + ".pdf"
     else:
         output_base = None
@@ -658,5 +1074,137 @@ def main():
                           json.dumps(json_dat, sort_keys=True, indent=4),
                           encrypt_to=opts.gpg_encrypt_to)
 
+def _output_base(output_base):
+    base, sep, out = output_base.rpartition('/')
+    if sep:
+        os.makedirs(base, mode=0o700, exist_ok=True)
+    return output_base if out != '' else output_base + "password"
+
+def _parse_range(s):
+    # "A-B", "A-" or "A" (1-origin, inclusive) to (start, stop) of islice
+    mo = re.fullmatch(r'(\d+)(?:(-)(\d*))?', s)
+    if not mo or int(mo.group(1)) < 1:
+        raise ValueError(s)
+    first = int(mo.group(1))
+    if mo.group(2) == None:
+        return first - 1, first
+    elif mo.group(3) == '':
+        return first - 1, None
+    elif int(mo.group(3)) >= first:
+        return first - 1, int(mo.group(3))
+    else:
+        raise ValueError(s)
+
+def _verified(elements):
+    for json_dat in elements:
+        verify_json_data(json_dat)
+        yield json_dat
+
+def _json_elements(json_dat):
+    # JSON text of a passphrase within the "elements" array
+    return "\n".join("        " + l for l in
+                     json.dumps(json_dat, sort_keys=True, indent=4).split("\n"))
+
+def main_batch(parser, opts):
+    if opts.batch != None and opts.batch < 1:
+        parser.error("--batch must be positive")
+    if opts.encrypt:
+        parser.error("--encrypt cannot be used with --batch")
+    if (opts.split or opts.jobs != None) and not opts.output_base:
+        parser.error("--split and --jobs require --output-base")
+    if opts.jobs != None and opts.jobs < 1 or opts.pages_per_file < 1:
+        parser.error("--jobs and --pages-per-file must be positive")
+    if opts.count != None:
+        parser.error("parameter count cannot be used with --batch")
+
+    if opts.json and opts.format != '-':
+        with open(opts.format, 'r', encoding='utf-8') as rf:
+            return _main_batch(parser, opts, rf)
+    return _main_batch(parser, opts, sys.stdin)
+
+def _main_batch(parser, opts, rf):
+    # rf: JSON input with --json
+    if opts.json:
+        elements = iter_json_passphrases(rf)
+        if opts.range:
+            try:
+                elements = itertools.islice(elements, *_parse_range(opts.range))
+            except ValueError:
+                parser.error("bad range given: {}".format(opts.range))
+        if opts.batch:
+            elements = itertools.islice(elements, opts.batch)
+    else:
+        if opts.range:
+            parser.error("--range requires --json")
+        try:
+            l, diag = password_generator.generate(opts.format, opts.batch)
+        except password_generator.BadFormatError as e:
+            parser.error(e.args[0])
+        elements = diag['elements']
+
+    elements = _verified(elements)
+    try:
+        first = next(elements, None)
+    except BadDataError:
+        print("Bad data.  aborting.", file=sys.stderr)
+        exit(2)
+    if first == None:
+        parser.error("no passphrase selected from JSON input")
+    elements = itertools.chain([first], elements)
+
+    os.umask(os.umask(0o077) | 0o077)
+
+    pdfopts = dict(qrcode=opts.qrcode,
+                   wifi_ssid=opts.wifi_ssid,
+                   layout=opts.layout,
+                   hint=opts.hint,
+                   pwdelems=opts.pwdelems,
+                   title=opts.title)
+
+    if opts.output_base:
+        output_base = _output_base(opts.output_base)
+    else:
+        output_base = None
+
+    count = 0
+    bad = False
+    with contextlib.ExitStack() as stack:
+        if output_base:
+            # text outputs are written while passphrases are rendered.
+            txtf = stack.enter_context(open_textfile(output_base + ".txt", opts.gpg_encrypt_to))
+            jsonf = stack.enter_context(open_textfile(output_base + ".json", opts.gpg_encrypt_to))
+        def written(elements):
+            nonlocal count
+            for json_dat in elements:
+                if output_base:
+                    print(("\n" if count else "") + "".join(e['password'] for e in json_dat),
+                          end="", file=txtf)
+                    print((",\n" if count else '{\n    "elements": [\n') + _json_elements(json_dat),
+                          end="", file=jsonf)
+                count += 1
+                yield json_dat
+
+        try:
+            if opts.split or opts.jobs != None:
+                render_files(output_base, written(elements), jobs=opts.jobs or 1, split=opts.split,
+                             pages_per_file=opts.pages_per_file, progress=True, **pdfopts)
+            else:
+                output = output_base + ".pdf" if output_base else opts.output
+                generate_pdf_batch(output, written(elements), **pdfopts)
+        except BadDataError:
+            # keep the text outputs of passphrases read so far valid.
+            bad = True
+
+        if output_base:
+            print(("" if count else '{\n    "elements": [') + "\n    ]\n}", end="", file=jsonf)
+
+    if bad:
+        print("\nBad data after {} passphrases.  aborting.".format(count), file=sys.stderr)
+        if output_base:
+            print("{0}.txt and {0}.json hold the passphrases read so far.".format(output_base), file=sys.stderr)
+        exit(2)
+
+    print("\nGenerated {} passwords.".format(count))
+
 if __name__ == '__main__':
     main()
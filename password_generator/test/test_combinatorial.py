@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# Tests for combinations of virtual word corpora (arithmetic and
+# transformed corpora) in combinatorial specs.
+
+import time
+import random
+import unittest
+
+from util import password_generator, generate
+from password_generator import combinatorial_passwords
+
+BadFormatError = password_generator.BadFormatError
+
+
+CombinatorialGenerator = combinatorial_passwords.CombinatorialGenerator
+CombinatorialWordDictionary = combinatorial_passwords.CombinatorialWordDictionary
+
+class TestCountingEngines(unittest.TestCase):
+    def test_random(self):
+        r = random.Random(1)
+        for _ in range(300):
+            m = r.randrange(1, 5)
+            N = tuple(r.randrange(1, 30) for _ in range(m))
+            v = tuple(r.randrange(0, 5) for _ in range(m))
+            n = r.randrange(0, 25)
+            self.assertEqual(CombinatorialWordDictionary.combinations_closed(n, N, v),
+                             CombinatorialWordDictionary.combinations(n, N, v), (n, N, v))
+
+    def test_shared_cache(self):
+        # polynomials cached by prefixes of v are reused over n and
+        # over requirement vectors sharing a prefix.
+        r = random.Random(2)
+        N = (26, 26, 10, 32)
+        cache = {}
+        for _ in range(100):
+            v = (3, 3) + tuple(r.randrange(0, 4) for _ in range(2))
+            n = r.randrange(0, 40)
+            self.assertEqual(CombinatorialWordDictionary.combinations_closed(n, N, v, cache=cache),
+                             CombinatorialWordDictionary.combinations(n, N, v), (n, v))
+        self.assertIn((3, 3), cache)
+
+    def test_unrank(self):
+        # both engines give the same count and the same words.
+        wordsets = [(password_generator.BasicCharacterCorpus(s), c)
+                    for s, c in (('ABC', 2), ('abcd', 1), ('01', 2))]
+        x, y = (CombinatorialGenerator(wordsets, engine=e).get_repeated(8) for e in ('dp', 'closed'))
+        self.assertEqual(x.len(), y.len())
+        for i in range(0, x.len(), 7919):
+            self.assertEqual(x.get_word(i), y.get_word(i))
+
+class TestArithmeticWordsets(unittest.TestCase):
+    def test_too_large(self):
+        for spec in ('{[uuid]1e1}3', '{[pin8]1e1}3'):
+            t = time.perf_counter()
+            with self.assertRaises(BadFormatError):
+                generate(spec)
+            self.assertLess(time.perf_counter() - t, 5.0)
+
+    def test_small(self):
+        l, diag = generate('{[pin4]1e1}3')
+        english = password_generator.CorpusList.get_corpus('english')
+        for (p, h), elems in zip(l, diag['elements']):
+            self.assertEqual(p, h)
+            words = [e['password'] for e in elems if not e['separator']]
+            self.assertEqual(len(words), 3)
+            self.assertTrue(any(w.isdigit() and len(w) == 4 for w in words))
+            self.assertTrue(any(w in english for w in words))
+
+class TestTransformedWordsets(unittest.TestCase):
+    def test_index(self):
+        e = password_generator.CorpusList.get_corpus('english').subset('a-z')
+        for c in (password_generator.TransformedCorpus(e, 'cap'),
+                  password_generator.TransformedCorpus(password_generator.TransformedCorpus(e, 'cap'), 'a2')):
+            for i in range(0, c.len(), 997):
+                w = c.get_with_hint(i)
+                self.assertEqual(c.index(w.word), i)
+                self.assertEqual(c.get_hint_by_word(w.word), w.hint)
+            self.assertNotIn('Zzz', c)
+
+    def test_combination(self):
+        l, diag = generate('{[english^a-z+cap]1[kana]1}3')
+        kana = password_generator.CorpusList.get_corpus('kana')
+        for (p, h), elems in zip(l, diag['elements']):
+            self.assertEqual(p, h)
+            words = [e['password'] for e in elems if not e['separator']]
+            self.assertEqual(len(words), 3)
+            self.assertTrue(any(w in kana for w in words))
+
+    def test_hints(self):
+        # hints of suffix characters come from the character set.
+        l, diag = generate('{[english^a-z+a1]1[kana]1}2', 200)
+        self.assertTrue(any('[' in h for p, h in l))
+        for p, h in l:
+            self.assertEqual(h.count('['), h.count(']'))
+
+    def test_too_large(self):
+        with self.assertRaises(BadFormatError):
+            generate('{[english^a-z+d4]1[kana]1}3')
+
+if __name__ == '__main__':
+    unittest.main()
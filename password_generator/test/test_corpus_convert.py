@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+# Tests for corpus_convert.
+
+import os
+import io
+import random
+import itertools
+import tempfile
+import unittest
+
+import util
+import corpus_convert
+import corpus_loader
+
+class TestRomanization(unittest.TestCase):
+    # the cluster table against the rewrite rules applied directly.
+    katakana = [chr(c) for c in range(0x30a1, 0x30f7)] + ['ー']
+    hiragana = [chr(c) for c in range(0x3041, 0x3097)]
+
+    def check(self, strings):
+        R = corpus_convert.Romanization
+        for s in strings:
+            self.assertEqual(R.romanization(s), R.romanization_by_rules(s), s)
+
+    def test_short(self):
+        # hiragana are romanized by the same rules as katakana.
+        chars = self.katakana + self.hiragana + ['・']
+        self.check("".join(p) for l in (1, 2) for p in itertools.product(chars, repeat=l))
+        # the rules only rewrite around small kana (romanized with 'x').
+        small = corpus_convert.Romanization.small
+        self.check("".join(p) for p in itertools.product(self.katakana, repeat=3)
+                   if any(c in small for c in p))
+
+    def test_random(self):
+        r = random.Random(0)
+        chars = self.katakana + self.hiragana + ['・', 'a']
+        self.check("".join(r.choice(chars) for _ in range(r.randrange(1, 12))) for _ in range(20000))
+
+class TestConversionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = corpus_convert.ConversionCache(self.tmpdir.name, 'kakasi', 'opts')
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_get_many(self):
+        MISSING = corpus_convert.ConversionCache.MISSING
+        words = ['w{}'.format(i) for i in range(3000)]
+        self.cache.put_many((w, [w, i]) for i, w in enumerate(words))
+        # more keys than one query takes, with duplicates and misses
+        entries = words[::2] + ['missing', 'w5', 'w5']
+        r = self.cache.get_many(entries)
+        self.assertEqual(r[:1500], [[w, i] for i, w in enumerate(words)][::2])
+        self.assertIs(r[1500], MISSING)
+        self.assertEqual(r[1501:], [['w5', 5], ['w5', 5]])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1502, 1))
+
+    def test_namespace(self):
+        self.cache.put_many([('a', 1)])
+        other = corpus_convert.ConversionCache(self.tmpdir.name, 'chasen', 'opts')
+        try:
+            self.assertIs(other.get_many(['a'])[0], corpus_convert.ConversionCache.MISSING)
+        finally:
+            other.close()
+
+def pack_reference(coll):
+    # the previous packer: every suffix of a written string which is
+    # an entry is pointed into that string, the last one winning.
+    coll = sorted((k.encode('ascii') + b'\n', h.encode('utf-8') + b'\n') for k, h in coll)
+    words = {}
+    for k, h in coll:
+        words[k] = words[h] = None
+    dat = bytearray()
+    p = 0
+    for i in sorted(words.keys(), key=(lambda v: [*reversed(v), 256])):
+        if words[i] != None:
+            continue
+        dat.extend(i)
+        for ss in range(len(i)):
+            if i[ss:] in words:
+                words[i[ss:]] = p + ss
+        p += len(i)
+    ptr = b'%07x\n' % (corpus_convert.CompactedCorpus.MAGIC,)
+    ptr += b''.join(b'%07x %07x\n' % (words[k], words[h]) for k, h in coll)
+    return bytes(dat), ptr
+
+class TestPackShared(unittest.TestCase):
+    def check(self, coll):
+        o = io.BytesIO()
+        corpus_convert.save_compact_corpus(o, coll)
+        dat, ptr = pack_reference(coll)
+        self.assertTrue(o.getvalue().endswith(dat + ptr + corpus_convert.CompactedCorpus.HEADER2))
+
+    def test_shared_suffixes(self):
+        self.check([('nation', 'nation'), ('ation', 'tion'), ('on', 'ion'), ('ion', 'on'),
+                    ('n', 'かな'), ('kana', 'な'), ('ana', 'かな'), ('a', 'na')])
+
+    def test_random(self):
+        r = random.Random(1)
+        hints = ['n', 'on', 'ion', 'tion', 'な', 'かな', 'ん']
+        for _ in range(200):
+            coll = {}
+            for _ in range(r.randrange(2, 40)):
+                w = "".join(r.choice('aenost') for _ in range(r.randrange(1, 6)))
+                coll[w] = r.choice([w, w[1:] or w, "".join(r.choice(hints) for _ in range(r.randrange(1, 4)))])
+            if len(coll) >= 2:
+                self.check(list(coll.items()))
+
+def entries(b):
+    c = corpus_loader.CompactedCorpus(io.BufferedReader(io.BytesIO(b)), use_mmap=False)
+    return [tuple(c.get_with_hint(i)) for i in range(c.len())]
+
+class TestExternalBuilder(unittest.TestCase):
+    def build(self, coll, **kwargs):
+        o = io.BytesIO()
+        with tempfile.TemporaryDirectory() as d:
+            corpus_convert.save_compact_corpus_external(o, iter(coll), boilerplate="test", tmpdir=d, **kwargs)
+            self.assertEqual(os.listdir(d), [])
+        return o.getvalue()
+
+    def test_runs(self):
+        r = random.Random(3)
+        words = ["".join(r.choice('abcxyz') for _ in range(r.randrange(1, 6))) for _ in range(500)]
+        coll = [(w, r.choice([w, w.upper(), 'かな', 'か'])) for w in words]
+        # duplicated words keep their smallest hint.
+        expected = {}
+        for w, h in coll:
+            expected[w] = min(h, expected.get(w, h))
+        self.assertLess(len(expected), len(coll))
+
+        b = self.build(coll)
+        for run_size in (1, 100, 1000, 10000):
+            self.assertEqual(self.build(coll, run_size=run_size), b)
+        self.assertEqual(b[15:].split(b' ')[2], b'%08x' % corpus_loader.CompactedCorpus.VERSION_WIDE)
+
+        o = io.BytesIO()
+        corpus_convert.save_compact_corpus(o, list(expected.items()), boilerplate="test")
+        self.assertEqual(entries(b), entries(o.getvalue()))
+        self.assertEqual(entries(b), sorted(expected.items()))
+
+    def test_too_small(self):
+        with self.assertRaises(ValueError):
+            self.build([('a', 'a'), ('a', 'b')], run_size=1)
+
+if __name__ == '__main__':
+    unittest.main()
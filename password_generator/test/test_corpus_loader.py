@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+# Tests for loading packed corpora.
+
+import os
+import io
+import mmap
+import tempfile
+import unittest
+
+import util
+import corpus_convert
+import corpus_loader
+from util import password_generator
+
+CompactedCorpus = corpus_loader.CompactedCorpus
+BadFormatError = password_generator.BadFormatError
+
+COLL = [('alpha', 'アルファ'), ('beta', 'ベータ'), ('gamma', 'gamma'), ('delta', 'ta'), ('zeta', 'ta')]
+
+def packed(coll=COLL, **kwargs):
+    o = io.BytesIO()
+    corpus_convert.save_compact_corpus(o, coll, boilerplate="test", **kwargs)
+    return o.getvalue()
+
+def wide(coll, pad):
+    # a v4 corpus whose words are placed after pad octets of a hole.
+    fmt_magic, fmt_head, fmt_idx = corpus_convert.PACKED_FORMATS[CompactedCorpus.VERSION_WIDE]
+    dat = bytearray()
+    idx = bytearray(fmt_head % (CompactedCorpus.MAGIC,))
+    for k, h in sorted(coll):
+        idx.extend(fmt_idx % (pad + len(dat), pad + len(dat) + len(k) + 1))
+        dat.extend(k.encode('ascii') + b'\n' + h.encode('utf-8') + b'\n')
+    return (CompactedCorpus.HEADER +
+            fmt_magic % (CompactedCorpus.MAGIC, CompactedCorpus.VERSION_WIDE, 0, pad + len(dat), len(coll)) +
+            CompactedCorpus.HEADER2, pad, bytes(dat) + bytes(idx) + CompactedCorpus.HEADER2)
+
+def flat(w):
+    head, pad, tail = w
+    return head + bytes(pad) + tail
+
+class CorpusTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'test.corpus')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def load(self, b, use_mmap):
+        with open(self.fname, 'wb') as f:
+            if type(b) is tuple:
+                # (head, hole length, tail)
+                f.write(b[0])
+                f.seek(b[1], io.SEEK_CUR)
+                f.write(b[2])
+            else:
+                f.write(b)
+        with open(self.fname, 'rb') as f:
+            c = CompactedCorpus(f, errorclass=BadFormatError, use_mmap=use_mmap)
+        self.assertEqual(isinstance(c.dat, mmap.mmap), use_mmap)
+        return c
+
+    def entries(self, c):
+        return [tuple(c.get_with_hint(i)) for i in range(c.len())]
+
+class TestCompactedCorpus(CorpusTestCase):
+    def test_mmap(self):
+        for b in (packed(), flat(wide(COLL, 0))):
+            self.assertEqual(self.entries(self.load(b, True)), sorted(COLL))
+            self.assertEqual(self.entries(self.load(b, False)), sorted(COLL))
+
+    def test_wide_offsets(self):
+        c = self.load(wide(COLL, (1 << 28) + 12345), True)
+        self.assertEqual(self.entries(c), sorted(COLL))
+        self.assertGreater(c._getidx(1), 1 << 28)
+
+    def test_bad(self):
+        for b in (packed(), flat(wide(COLL, 0))):
+            for use_mmap in (True, False):
+                for l in range(len(b)):
+                    with self.assertRaises(BadFormatError, msg=(l, use_mmap)):
+                        self.load(b[:l], use_mmap)
+                with self.assertRaises(BadFormatError):
+                    self.load(b + b'\n', use_mmap)
+                with self.assertRaises(BadFormatError):
+                    self.load(b + CompactedCorpus.HEADER2, use_mmap)
+
+class TestBlockCompressed(CorpusTestCase):
+    def test_round_trip(self):
+        coll = [('w{:04d}'.format(i), 'ヒント{}'.format(i % 7)) for i in range(1000)]
+        for codec in ('zlib', 'lzma'):
+            for block_entries in (1, 3, 64, 2000):
+                b = packed(coll, compress=codec, block_entries=block_entries, rest="rest")
+                for use_mmap in (True, False):
+                    c = self.load(b, use_mmap)
+                    self.assertEqual(self.entries(c), coll)
+                    self.assertEqual(c.get_word(999), 'w0999')
+
+    def test_bad_blockinfo(self):
+        b = packed(compress='zlib', block_entries=2)
+        pos = b.index(b'zlib ')
+        info = b[pos : pos + CompactedCorpus.BLOCKINFO_LEN]
+        for bad in (b'gzip' + info[4:],                        # codec
+                    info[:5] + b'00000000' + info[13:],        # entries per block
+                    info[:-2] + b'2\n',                         # number of blocks
+                    info[:-2] + b'g\n',                         # not a number
+                    info[:20] + b' ' + info[21:]):             # layout
+            with self.assertRaises(BadFormatError, msg=bad):
+                self.load(b[:pos] + bad + b[pos + len(bad):], True)
+        # data sections ending in the block-info or the offsets
+        fmt_magic, fmt_head, fmt_idx = corpus_convert.PACKED_FORMATS[CompactedCorpus.VERSION_BLOCKS]
+        for l in range(CompactedCorpus.BLOCKINFO_LEN + 17 * 4):
+            with self.assertRaises(BadFormatError, msg=l):
+                self.load(CompactedCorpus.HEADER +
+                          fmt_magic % (CompactedCorpus.MAGIC, CompactedCorpus.VERSION_BLOCKS, 0, l, len(COLL)) +
+                          CompactedCorpus.HEADER2 + b[pos : pos + l] + fmt_head % (CompactedCorpus.MAGIC,) +
+                          CompactedCorpus.HEADER2, True)
+
+    def test_corrupt_block(self):
+        b = packed(compress='zlib', block_entries=2)
+        pos = b.index(b'zlib ') + CompactedCorpus.BLOCKINFO_LEN
+        # block offsets out of order or outside of the data section
+        for o in (b'%016x\n' % 5, b'%016x\n' % (1 << 40)):
+            c = self.load(b[:pos + 17] + o + b[pos + 34:], True)
+            with self.assertRaises(ValueError):
+                self.entries(c)
+        # broken compressed data
+        end = b.index(b'%016x\n' % (CompactedCorpus.MAGIC,), pos)
+        c = self.load(b[:end - 3] + b'xxx' + b[end:], True)
+        with self.assertRaises(ValueError):
+            self.entries(c)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+# Tests for incremental JSON input of make-password-sheet.
+
+import os
+import sys
+import io
+import json
+import contextlib
+import tempfile
+import tracemalloc
+import unittest
+
+from util import password_generator, generate
+from password_generator import pdf_generator
+
+
+class TestJSONInput(unittest.TestCase):
+    def test_large_dump(self):
+        # make-password --json output with a large "passwords" array
+        # before and after a short "elements" array.
+        l, diag = generate('e3', 5)
+        passwords = [[p + str(i), h + str(i)] for i in range(15000) for p, h in l]
+        with tempfile.TemporaryDirectory() as d:
+            fname = os.path.join(d, 'dump.json')
+            with open(fname, 'w', encoding='utf-8') as f:
+                f.write('{"diag": "", "entropy": 1.0, "passwords": ')
+                json.dump(passwords, f)
+                f.write(', "elements": ')
+                json.dump(diag['elements'], f)
+                f.write(', "more": ')
+                json.dump({"passwords": passwords}, f)
+                f.write('}')
+            size = os.path.getsize(fname)
+
+            with open(fname, encoding='utf-8') as f:
+                tracemalloc.start()
+                try:
+                    elements = list(pdf_generator.iter_json_passphrases(f))
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+        self.assertEqual(elements, diag['elements'])
+        self.assertGreater(size, 3000000)
+        self.assertLess(peak, size / 10)
+
+    def test_skip(self):
+        tricky = {"a": ["]", "}", "\\\"[{", "あ" * 10], "b": [[], {}, [1, [2.5, None]]],
+                  "c": "x\\" * 20}
+        text = json.dumps(tricky) + ' "tail" ' + json.dumps(["x\\]"] * 30) + ' 12345 [1]'
+        for bufsize in (1, 2, 3, 7, 64):
+            r = pdf_generator._JSONReader(io.StringIO(text), bufsize=bufsize)
+            r.skip()
+            self.assertEqual(r.value(), "tail")
+            r.skip()
+            r.skip()
+            self.assertEqual(r.value(), [1])
+            self.assertEqual(r.peek(), "")
+
+    def test_skip_bad(self):
+        for text in ('[1, 2', '{"a": "b', '[1}', '"abc'):
+            r = pdf_generator._JSONReader(io.StringIO(text), bufsize=2)
+            with self.assertRaises(pdf_generator.BadDataError):
+                r.skip()
+
+class TestBatch(unittest.TestCase):
+    def test_bad_data(self):
+        # bad data after some passphrases: the text outputs so far are
+        # closed as valid files.
+        l, diag = generate('e3', 5)
+        elements = diag['elements'][:3] + [[{"password": 1}]] + diag['elements'][3:]
+        with tempfile.TemporaryDirectory() as d:
+            fname = os.path.join(d, 'in.json')
+            with open(fname, 'w', encoding='utf-8') as f:
+                json.dump({"elements": elements}, f)
+            base = os.path.join(d, 'out', 'base')
+            argv = sys.argv
+            err = io.StringIO()
+            try:
+                sys.argv = ['make-password-sheet', '--json', '--range', '1-', '-O', base, fname]
+                with contextlib.redirect_stderr(err), contextlib.redirect_stdout(io.StringIO()):
+                    with self.assertRaises(SystemExit) as cm:
+                        pdf_generator.main()
+            finally:
+                sys.argv = argv
+            self.assertEqual(cm.exception.code, 2)
+            self.assertIn("after 3 passphrases", err.getvalue())
+            with open(base + '.json', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), {"elements": diag['elements'][:3]})
+            with open(base + '.txt', encoding='utf-8') as f:
+                self.assertEqual(f.read().split("\n"), [p for p, h in l[:3]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+# Tests for random sources of generate().
+
+import unittest
+
+from util import password_generator, generate
+
+class TestRandomSource(unittest.TestCase):
+    def test_seeded_refused(self):
+        with self.assertRaises(RuntimeError):
+            password_generator.generate('e3', 1, rng=password_generator.SeededRandom(0))
+
+    def test_seeded_repeatable(self):
+        self.assertEqual(generate('e3-[kana]2-[uuid]', 10)[0], generate('e3-[kana]2-[uuid]', 10)[0])
+
+    def test_os_random(self):
+        r = password_generator.OSRandom(bufsize=16)
+        self.assertEqual(r.getrandbits(0), 0)
+        for k in (1, 7, 8, 100, 1000):
+            self.assertLess(r.getrandbits(k), 1 << k)
+        self.assertEqual(set(r.randrange(3) for _ in range(300)), {0, 1, 2})
+
+if __name__ == '__main__':
+    unittest.main()
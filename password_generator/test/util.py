@@ -0,0 +1,16 @@
+# Common set-up of the tests: the repository top (for the package)
+# and the package directory (for the corpus tools, which are run as
+# scripts) are put on sys.path.
+
+import sys
+import os
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, os.path.join(TOP, 'password_generator'))
+sys.path.insert(0, TOP)
+
+import password_generator.password_generator as password_generator
+
+def generate(spec, count=20):
+    # seeded (INSECURE) source: the same passphrases on every run
+    return password_generator.generate(spec, count, rng=password_generator.SeededRandom(0), _insecure=True)
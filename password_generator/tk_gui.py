@@ -1,10 +1,13 @@
 #!/usr/bin/python3
 import sys
 import time
+import threading
+import queue
 import tkinter as tk
 import tkinter.ttk as ttk
 #from tkinter import ttk
 from tkinter import font
+from tkinter import messagebox
 from collections import OrderedDict
 
 if '.' not in __name__:
@@ -31,6 +34,9 @@ passwordtypes = OrderedDict([
 
 custom_passwordtype_index = list(passwordtypes.keys()).index('Custom...')
 
+# corpora loaded in background at startup, in this order.
+preload_corpora = ('j', 'E', 'e', 'J')
+
 separators = OrderedDict([
     ('default', ''),
     ('space', ' '),
@@ -159,8 +165,8 @@ class BulkUI(CustomFrame):
         t = self.stylelabel = ttk.Label(self, text="-")
         t.grid(row=0, column=0, sticky=tk.W)
 
-        t = tk.Button(self, text="Add more",
-                      command=self.generate_more)
+        t = self.morebutton = tk.Button(self, text="Add more",
+                                        command=self.generate_more)
         t.grid(row=1, column=0, sticky=tk.W)
 
         t = self.bulktext = tk.Text(self)
@@ -175,6 +181,15 @@ class BulkUI(CustomFrame):
 
         self.stylelabel['text'] = diag_string
 
+    def append_data(self, diag_string, dat):
+        for d in dat:
+            self.bulktext.insert('end', d[0] + "\n", [])
+
+        self.stylelabel['text'] = diag_string
+
+    def set_busy(self, busy):
+        self.morebutton['state'] = 'disabled' if busy else 'normal'
+
     def generate_more(self, *args):
         self.master.add_more_passphrases()
 
@@ -205,13 +220,19 @@ class ConfigUI(CustomFrame):
         t.bind('<KeyRelease>', self.spec_inputed)
 
         f = tk.Frame(self)
-        ib1 = tk.Button(f, text="Generate", font=self.smallfont,
-                      command=self.generate_pressed)
+        ib1 = self.generatebutton = tk.Button(f, text="Generate", font=self.smallfont,
+                                              command=self.generate_pressed)
         ib1.pack(side = 'left')
+        t = self.status = ttk.Label(f, text="")
+        t.pack(side = 'left', padx=5)
 
         f.grid(row=4, column=0, sticky=('W',))
         self.spec_update()
 
+    def set_busy(self, busy):
+        self.generatebutton['state'] = 'disabled' if busy else 'normal'
+        self.status['text'] = "Generating..." if busy else ""
+
     def generate_pressed(self):
         spec = self.spec.get()
         self.master.generate_passphrases(spec)
@@ -241,10 +262,26 @@ class ConfigUI(CustomFrame):
         self.spec_update()
 
 class PasswordApp(ttk.Notebook):
+    # interval to check results from the worker thread, in ms.
+    POLL_INTERVAL = 50
+
     def __init__(self, master, name="a"):
         super().__init__(master, name=name)
         self.master = master
         self.current_spec = self.current_dat = None
+        self.busy = False
+
+        # passphrases are generated in a worker thread, so that
+        # loading corpora does not freeze the window.
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.pending = 0
+        threading.Thread(target=self._worker, daemon=True).start()
+        # preloads have their own thread, not to delay the first
+        # request behind slow corpora.  A corpus requested while
+        # being preloaded is just loaded twice.
+        threading.Thread(target=self._preload, args=preload_corpora, daemon=True).start()
+
         self.config_ui = ConfigUI(master=self, name="config")
         self.list_ui = ListUI(master=self, name="list")
         self.bulk_ui = BulkUI(master=self, name="bulk")
@@ -253,9 +290,65 @@ class PasswordApp(ttk.Notebook):
         self.add(self.bulk_ui, text="Bulk Copy")
         self.pack()
 
+    def _worker(self):
+        while True:
+            f, args, callback = self.jobs.get()
+            try:
+                r = (f(*args), None)
+            except Exception as e:
+                r = (None, e)
+            if callback:
+                self.results.put((callback, r))
+
+    @staticmethod
+    def _preload(*corpora):
+        for c in corpora:
+            try:
+                password_generator.CorpusList.get_corpus(c)
+            except password_generator.BadFormatError:
+                pass
+
+    def _submit(self, f, args, callback):
+        # run f(*args) in the worker; callback(result, exception)
+        # is called later in the Tk main thread.
+        self.jobs.put((f, args, callback))
+        self.pending += 1
+        if self.pending == 1:
+            self.after(self.POLL_INTERVAL, self._poll)
+
+    def _poll(self):
+        while True:
+            try:
+                callback, r = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            callback(*r)
+        if self.pending:
+            self.after(self.POLL_INTERVAL, self._poll)
+
+    def set_busy(self, busy):
+        self.busy = busy
+        self.config_ui.set_busy(busy)
+        self.bulk_ui.set_busy(busy)
+
+    def show_error(self, e):
+        messagebox.showerror("Error", e.args[0] if e.args else str(e), parent=self)
+
     def generate_passphrases(self, spec):
+        if self.busy:
+            return
+        self.set_busy(True)
+        self._submit(password_generator.generate, (spec, 10),
+                     lambda r, e: self._generated(spec, r, e))
+
+    def _generated(self, spec, r, e):
+        self.set_busy(False)
+        if e:
+            self.show_error(e)
+            return
+        dat, diag = r
         self.current_spec = spec
-        dat, diag = password_generator.generate(spec, 10)
         self.current_dat = (dat, diag)
 
         diag_string = self.diag_string = "Password spec = \"{}\", entropy = {:.3f} bits".format(spec, diag['entropy'])
@@ -266,18 +359,25 @@ class PasswordApp(ttk.Notebook):
         self.select(".a.list")
 
     def add_more_passphrases(self):
-        if self.current_spec is None:
+        if self.current_spec is None or self.busy:
+            return
+        self.set_busy(True)
+        self._submit(password_generator.generate, (self.current_spec, 10),
+                     self._added)
+
+    def _added(self, r, e):
+        self.set_busy(False)
+        if e:
+            self.show_error(e)
             return
         dat, diag = self.current_dat
-        dat2, diag2 = password_generator.generate(self.current_spec, 10)
+        dat2, diag2 = r
 
-        dat[0] += dat2[0]
-        dat[1] += dat2[1]
-        diag['passwords'] += diag2['passwords']
+        dat += dat2
+        diag['passwords'] = dat
         diag['elements'] += diag2['elements']
 
-        self.current_dat = (dat, diag)
-        self.bulk_ui.update_data(self.diag_string, dat, diag)
+        self.bulk_ui.append_data(self.diag_string, dat2)
 
 def main():
     root = tk.Tk()